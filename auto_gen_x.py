@@ -1,15 +1,20 @@
 import os
-import time
-import random
-import tweepy
 import re
-import json
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import warnings
 
-from google import genai
-from google.genai import types
+from history_store import HistoryStore
+from post_journal import PostJournal
+from scheduler import DailyScheduler
+import segmenter
+import metrics
+import clients
+import gemini_hedge
 
 warnings.filterwarnings("ignore")
 
@@ -33,38 +38,67 @@ TZ = ZoneInfo("Asia/Tokyo")
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
 GEMINI_TEMP_DRAFT = float(os.getenv("GEMINI_TEMP_DRAFT", "1.2"))
 GEMINI_TEMP_POLISH = float(os.getenv("GEMINI_TEMP_POLISH", "0.3"))
+# 下書きを何本まとめて作って選ぶか（1なら従来どおり 下書き→整える）
+GEMINI_CANDIDATES = int(os.getenv("GEMINI_CANDIDATES", "3"))
+
+# 完成文が過去の投稿とほぼ同じ（dedup_index の DUP_THRESHOLD 以上）だったときに作り直す回数
+DUP_RETRY = int(os.getenv("AUTO_GEN_X_DUP_RETRY", "1"))
 
 # デプロイ即投稿フラグ（Trueでも「1日1回ガード」があるので安全）
 DEPLOY_RUN = (os.getenv("DEPLOY_RUN", "0") == "1")
 
+# スレッドが途中で止まったときの再開間隔（秒）
+RETRY_SEC = int(os.getenv("AUTO_GEN_X_RETRY_SEC", "60"))
+
+# 作り置き：空いている時間帯に先の何日分の完成文を作っておくか（0 で無効＝毎回その場で生成）
+QUEUE_DAYS = int(os.getenv("AUTO_GEN_X_QUEUE_DAYS", "3"))
+# 作り置きを補充する時刻（JST）
+QUEUE_FILL_TIME = os.getenv("AUTO_GEN_X_QUEUE_FILL_TIME", "03:10")
+# 1 なら Gemini の Batch API でまとめて頼む（結果は後から受け取る。次の補充か投稿時に回収）
+QUEUE_BATCH = (os.getenv("AUTO_GEN_X_QUEUE_BATCH", "0") == "1")
+# これより古い作り置きは捨てる（日数）
+QUEUE_MAX_AGE_DAYS = 7
+
 # =========================
 # 永続ファイル（Railway/再起動でも守る）
 # =========================
-HISTORY_PATH = "post_history.json"          # モード交互・視点履歴
-DAILY_STATE_PATH = "daily_post_state.json"  # 1日1回ガード
+HISTORY_DB_PATH = "post_history.sqlite3"    # モード交互・視点履歴・1日1回ガード・投稿履歴
+JOURNAL_PATH = "post_journal.json"          # 投稿途中のスレッド（続きから再開）
+DEDUP_PATH = "post_dedup.npz"               # 全投稿の MinHash 索引（過去とほぼ同じ文の検出）
+# 旧形式（初回起動時に DB へ取り込む）
+LEGACY_HISTORY_PATH = "post_history.json"
+LEGACY_DAILY_STATE_PATH = "daily_post_state.json"
 
 # =========================
-# 1日1回ガード（最重要：同日2回を物理的に防止）
+# 履歴（思想⇄身体交互・視点ローテ・1日1回ガード）
+#   読むのは job の最初だけ。書き込みは投稿が全部成功した後に1回でまとめて確定する
+#   （投稿に失敗したらモードも視点も進めない）
 # =========================
-def load_daily_state():
-    if not os.path.exists(DAILY_STATE_PATH):
-        return {"last_post_date": None}
-    try:
-        with open(DAILY_STATE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"last_post_date": None}
-
-def save_daily_state(st):
-    try:
-        with open(DAILY_STATE_PATH, "w", encoding="utf-8") as f:
-            json.dump(st, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
+_history = None
+_history_lock = threading.Lock()
+
+def history():
+    """履歴 DB。import しただけでは作らず、最初に使う時に開く（初回は旧 JSON を取り込む）"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            store = HistoryStore(HISTORY_DB_PATH, {
+                "last_mode": "身体",          # 次は思想から始めるなら "身体" を初期に
+                "last_viewpoint_思想": -1,
+                "last_viewpoint_身体": -1,
+                "last_post_date": None,
+            })
+            store.import_json(LEGACY_HISTORY_PATH, LEGACY_DAILY_STATE_PATH)
+            _history = store
+        return _history
+
+journal = PostJournal(JOURNAL_PATH)
 
+# =========================
+# 1日1回ガード（最重要：同日2回を物理的に防止）
+# =========================
 def last_post_date():
-    st = load_daily_state()
-    v = st.get("last_post_date")
+    v = history().get("last_post_date")
     if not v:
         return None
     try:
@@ -72,73 +106,36 @@ def last_post_date():
     except Exception:
         return None
 
-def mark_posted_today():
-    st = load_daily_state()
-    st["last_post_date"] = datetime.now(TZ).isoformat(timespec="seconds")
-    save_daily_state(st)
-
-# =========================
-# 履歴（思想⇄身体交互・視点ローテ）
-# =========================
-def load_history():
-    if not os.path.exists(HISTORY_PATH):
-        return {
-            "last_mode": "身体",          # 次は思想から始めるなら "身体" を初期に
-            "last_viewpoint_思想": -1,
-            "last_viewpoint_身体": -1
-        }
-    try:
-        with open(HISTORY_PATH, "r", encoding="utf-8") as f:
-            h = json.load(f)
-        # 互換性
-        h.setdefault("last_mode", "身体")
-        h.setdefault("last_viewpoint_思想", -1)
-        h.setdefault("last_viewpoint_身体", -1)
-        return h
-    except Exception:
-        return {
-            "last_mode": "身体",
-            "last_viewpoint_思想": -1,
-            "last_viewpoint_身体": -1
-        }
-
-def save_history(h):
-    try:
-        with open(HISTORY_PATH, "w", encoding="utf-8") as f:
-            json.dump(h, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
-
-# 思想⇄身体を交互にする
-def next_mode():
-    h = load_history()
-    last = h.get("last_mode", "身体")
-    mode = "思想" if last == "身体" else "身体"
-    h["last_mode"] = mode
-    h["updated_at"] = datetime.now(TZ).isoformat(timespec="seconds")
-    save_history(h)
-    return mode
+# 思想⇄身体を交互にする（確定は投稿成功後）
+# get は状態の読み取り関数（先の日の予定を作るときは仮の状態の dict.get を渡す）
+def next_mode(get=None):
+    last = (get or history().get)("last_mode", "身体")
+    return "思想" if last == "身体" else "身体"
 
 # モードごとに視点を回す（思想は3種、身体は解説中心）
 VIEWPOINTS_THOUGHT = ["安心", "反論", "暴露"]
 VIEWPOINTS_BODY = ["解説"]  # ここ増やしたければ ["解説","解説2"] みたいにしてOK
 
-def next_viewpoint(mode: str):
-    h = load_history()
+def _viewpoints(mode: str):
     if mode == "思想":
-        arr = VIEWPOINTS_THOUGHT
-        key = "last_viewpoint_思想"
-    else:
-        arr = VIEWPOINTS_BODY
-        key = "last_viewpoint_身体"
-
-    last = int(h.get(key, -1))
-    idx = (last + 1) % len(arr)
-    vp = arr[idx]
-    h[key] = idx
-    h["updated_at"] = datetime.now(TZ).isoformat(timespec="seconds")
-    save_history(h)
-    return vp
+        return VIEWPOINTS_THOUGHT, "last_viewpoint_思想"
+    return VIEWPOINTS_BODY, "last_viewpoint_身体"
+
+def next_viewpoint(mode: str, get=None):
+    arr, key = _viewpoints(mode)
+    last = int((get or history().get)(key, -1))
+    return arr[(last + 1) % len(arr)]
+
+def rotation_updates(mode: str, viewpoint: str):
+    # 投稿成功時に確定する状態（モード・視点・投稿日）
+    arr, key = _viewpoints(mode)
+    now = datetime.now(TZ).isoformat(timespec="seconds")
+    return {
+        "last_mode": mode,
+        key: arr.index(viewpoint) if viewpoint in arr else -1,
+        "last_post_date": now,
+        "updated_at": now,
+    }
 
 # =========================
 # 禁止ワード（頻度コントロール）
@@ -158,7 +155,7 @@ def dynamic_avoid_words():
 # =========================
 # Gemini：下書き（思想/身体モードで分岐）
 # =========================
-def gemini_draft(gemini_client, mode: str, viewpoint: str) -> str:
+def draft_prompt(mode: str, viewpoint: str, avoid_words) -> str:
     viewpoint_rule = {
         "安心": "安心させる視点。敵ではない/守りの反応。説教せず静かに。",
         "反論": "誤解への反論。性格のせい・根性論をやさしく否定し、身体の反応に戻す。",
@@ -166,7 +163,6 @@ def gemini_draft(gemini_client, mode: str, viewpoint: str) -> str:
         "解説": "現象解説。首・喉・呼吸・みぞおち等の具体→日常場面→『切り替え』へ。"
     }.get(viewpoint, "やさしく、身体の反応として描く。")
 
-    avoid_words = dynamic_avoid_words()
     avoid_line = f"・次の語は原則使わない（必要なら言い換え）: {'、'.join(avoid_words)}" if avoid_words else ""
 
     mode_block = ""
@@ -215,22 +211,60 @@ def gemini_draft(gemini_client, mode: str, viewpoint: str) -> str:
 
 本文のみ出力。
 """.strip()
+    return prompt
 
-    r = gemini_client.models.generate_content(
-        model=MODEL_NAME,
-        contents=prompt,
-        config=types.GenerateContentConfig(temperature=GEMINI_TEMP_DRAFT)
+def candidate_text(candidate) -> str:
+    parts = getattr(getattr(candidate, "content", None), "parts", None) or []
+    return "".join(getattr(p, "text", None) or "" for p in parts).strip()
+
+def _draft_call(gemini_client, prompt: str, n: int = 1):
+    config = clients.genai_types().GenerateContentConfig(
+        temperature=GEMINI_TEMP_DRAFT,
+        candidate_count=n if n > 1 else None,
     )
-    return (r.text or "").strip()
+    with metrics.timer("gemini_draft"):
+        r = gemini_hedge.generate_content(gemini_client, model=MODEL_NAME, contents=prompt, config=config)
+    if n == 1:
+        return [(r.text or "").strip()]
+    return [candidate_text(c) for c in (getattr(r, "candidates", None) or [])]
+
+def gemini_draft(gemini_client, mode: str, viewpoint: str, avoid_words=None) -> str:
+    if avoid_words is None:
+        avoid_words = dynamic_avoid_words()
+    return _draft_call(gemini_client, draft_prompt(mode, viewpoint, avoid_words))[0]
+
+def gemini_drafts(gemini_client, mode: str, viewpoint: str, avoid_words, n: int):
+    """
+    下書きを n 本。1回の呼び出しで candidate_count=n を頼み、
+    足りない分（candidate_count 非対応のモデルなど）は並行して1本ずつ取る。
+    """
+    prompt = draft_prompt(mode, viewpoint, avoid_words)
+    try:
+        texts = [t for t in _draft_call(gemini_client, prompt, n) if t]
+    except Exception as e:
+        print(f"candidate_count error: {e}")
+        texts = []
+
+    missing = n - len(texts)
+    if missing > 0:
+        with ThreadPoolExecutor(max_workers=missing) as ex:
+            futures = [ex.submit(_draft_call, gemini_client, prompt) for _ in range(missing)]
+            for f in futures:
+                try:
+                    texts += [t for t in f.result() if t]
+                except Exception as e:
+                    print(f"draft error: {e}")
+    return texts
 
 # =========================
 # Gemini：整える（頻出語をさらに抑制）
 # =========================
-def gemini_polish(gemini_client, text: str) -> str:
+def gemini_polish(gemini_client, text: str, avoid_words=None) -> str:
     if not text:
         return text
 
-    avoid_words = dynamic_avoid_words()
+    if avoid_words is None:
+        avoid_words = dynamic_avoid_words()
     avoid_line = f"・次の語はできるだけ使わない（言い換え優先）: {'、'.join(avoid_words)}" if avoid_words else ""
 
     prompt = f"""
@@ -252,18 +286,84 @@ def gemini_polish(gemini_client, text: str) -> str:
 """.strip()
 
     try:
-        r = gemini_client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=GEMINI_TEMP_POLISH)
-        )
-        out = (r.text or "").strip() or text
-        if len(out) > MAX_TOTAL_CHARS:
-            out = out[:MAX_TOTAL_CHARS].rstrip()
-        return out
+        with metrics.timer("gemini_polish"):
+            r = gemini_hedge.generate_content(
+                gemini_client,
+                model=MODEL_NAME,
+                contents=prompt,
+                config=clients.genai_types().GenerateContentConfig(temperature=GEMINI_TEMP_POLISH)
+            )
+        # 長すぎる場合は split_into_thread が文末で切る
+        return (r.text or "").strip() or text
     except Exception:
         return text
 
+# =========================
+# 候補の採点（ローカル：長さ・回避語・禁止パターン・過去投稿との類似）
+# =========================
+EMOJI_RE = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F]")
+HASHTAG_RE = re.compile(r"[#＃][^\s#＃]")
+NUMBERING_RE = re.compile(r"[0-9０-９]+\s*[/／]\s*[0-9０-９]+|(^|\n)\s*[0-9０-９]+[.．)）]|[①-⑳]")
+
+DEDUP_SCOPE = "auto_gen_x"
+_dedup = None
+_dedup_lock = threading.Lock()
+
+def dedup():
+    """全投稿の近似重複索引。numpy を使うので最初に使う時に読み込む（初回は DB の履歴から作る）"""
+    global _dedup
+    with _dedup_lock:
+        if _dedup is None:
+            from dedup_index import NearDupIndex
+            idx = NearDupIndex(DEDUP_PATH)
+            if not idx.count(DEDUP_SCOPE):
+                # limit=-1 で全件
+                idx.add_many([(p["text"], p["day"]) for p in history().recent_posts(-1)], DEDUP_SCOPE)
+            _dedup = idx
+        return _dedup
+
+def check_candidate(text: str, avoid_words):
+    """
+    戻り値は (問題のリスト, スコア)。問題が無ければそのまま投稿できる。
+    スコアは 問題の少なさ → 上限の8割前後を使っているか → 過去投稿と似ていないか の順に効く。
+    """
+    problems = []
+    limit = MAX_TOTAL_CHARS * 2
+    w = segmenter.weighted_length(text)
+    if not text:
+        problems.append("空")
+    if w > limit:
+        problems.append(f"長さ超過({w}/{limit})")
+    else:
+        # 合計が収まっても、文の切れ目しだいで MAX_TWEETS_IN_THREAD ツリーに入りきらないことがある
+        n = len(segmenter.segment(text, TWEET_LIMIT * 2, min_len=40))
+        if n > MAX_TWEETS_IN_THREAD:
+            problems.append(f"ツリー超過({n}/{MAX_TWEETS_IN_THREAD})")
+    hits = [x for x in avoid_words if x in text]
+    if hits:
+        problems.append(f"回避語({'、'.join(hits)})")
+    if EMOJI_RE.search(text):
+        problems.append("絵文字")
+    if HASHTAG_RE.search(text):
+        problems.append("ハッシュタグ")
+    if NUMBERING_RE.search(text):
+        problems.append("番号")
+    sim, day = dedup().query(text, DEDUP_SCOPE)
+    if sim >= dedup().threshold:
+        problems.append(f"過去投稿と類似({day} {sim:.2f})")
+
+    score = -10 * len(problems) - abs(min(w / limit, 1.0) - 0.8) - sim
+    return problems, score
+
+def pick_candidate(candidates, avoid_words):
+    """最もスコアの高い候補と、その問題のリスト"""
+    best = None
+    for text in candidates:
+        problems, score = check_candidate(text, avoid_words)
+        if best is None or score > best[2]:
+            best = (text, problems, score)
+    return (best[0], best[1]) if best else ("", ["空"])
+
 # =========================
 # 連続同一行だけ最小限で潰す（保険）
 # =========================
@@ -285,38 +385,212 @@ def remove_consecutive_duplicate_lines(text: str) -> str:
 # 2ツリー固定の分割（余りmergeなし）
 # =========================
 def split_into_thread(text: str):
-    text = (text or "").strip()
-    if not text:
-        return []
-
-    if len(text) > MAX_TOTAL_CHARS:
-        text = text[:MAX_TOTAL_CHARS].rstrip()
-
-    if len(text) <= TWEET_LIMIT:
-        return [text]
-
-    window = text[:TWEET_LIMIT]
-    cut = -1
-    for m in re.finditer(r"[\n。！？!?]", window):
-        cut = m.end()
-
-    if cut < 20:
-        cut = TWEET_LIMIT
-
-    part1 = text[:cut].strip()
-    part2 = text[cut:].strip()
-    return [p for p in [part1, part2] if p]
+    # X換算（全角=2）の文字数で、最大2ツリーに収める（超える分は文末で切る）
+    text = segmenter.truncate_sentences((text or "").strip(), MAX_TOTAL_CHARS * 2)
+    return segmenter.segment(text, TWEET_LIMIT * 2, min_len=40, max_parts=MAX_TWEETS_IN_THREAD)
 
 # =========================
 # 投稿処理（1日1回ガード込み）
 # =========================
+def create_part(part, parent_id):
+    # journal.post から1ツイートずつ呼ばれる。戻り値は新しいツイートID
+    if parent_id:
+        resp = clients.get_x_client().create_tweet(text=part["text"], in_reply_to_tweet_id=parent_id)
+    else:
+        resp = clients.get_x_client().create_tweet(text=part["text"])
+    return resp.data["id"]
+
+def post_thread(jkey):
+    """ジャーナルの未投稿分を出す。全部出せたら履歴を確定して True"""
+    ok, _ = journal.post(jkey, create_part)
+    if not ok:
+        return False
+    entry = journal.get(jkey)
+    print(f"✅ 投稿成功！（{len(entry['parts'])}ツリー）")
+
+    # ---- 成功したら モード・視点・今日投稿済み・履歴 を1トランザクションで確定 ----
+    meta = entry["meta"]
+    try:
+        history().record_post(
+            meta.get("day", entry["day"]),
+            datetime.now(TZ).isoformat(timespec="seconds"),
+            meta.get("mode"),
+            meta.get("viewpoint"),
+            meta.get("text", ""),
+            entry["ids"],
+            rotation_updates(meta.get("mode"), meta.get("viewpoint")),
+            queue_id=meta.get("queue_id"),
+        )
+    except Exception as e:
+        # ジャーナルは残す（次の再実行で投稿はせずに確定だけやり直す）
+        print(f"history save error: {e}")
+        return False
+    journal.finish(jkey)
+    try:
+        dedup().add(meta.get("text", ""), DEDUP_SCOPE, meta.get("day", entry["day"]))
+    except Exception as e:
+        print(f"dedup index error: {e}")
+    return True
+
+def compose(gemini_client, mode: str, viewpoint: str, avoid_words) -> str:
+    """完成文を1本作る（下書き → 選ぶ / 整える）"""
+    if GEMINI_CANDIDATES > 1:
+        # 候補をまとめて作ってローカルで選ぶ。整える（polish）は選んだ候補に問題があるときだけ
+        candidates = gemini_drafts(gemini_client, mode, viewpoint, avoid_words, GEMINI_CANDIDATES)
+        candidates = [remove_consecutive_duplicate_lines(c) for c in candidates]
+        final, problems = pick_candidate(candidates, avoid_words)
+        print(f"【候補】{len(candidates)}本 / 問題: {'、'.join(problems) or 'なし'}")
+        if problems and final:
+            final = remove_consecutive_duplicate_lines(gemini_polish(gemini_client, final, avoid_words))
+        return final
+
+    draft = gemini_draft(gemini_client, mode=mode, viewpoint=viewpoint, avoid_words=avoid_words)
+    return remove_consecutive_duplicate_lines(gemini_polish(gemini_client, draft, avoid_words))
+
+# =========================
+# 作り置き（空いている時間帯に先の分を作り、投稿時はキューから出すだけ）
+# =========================
+def planned_slots(days: int):
+    """今の状態から、毎日投稿が成功した場合の先 days 回分の (モード, 視点)"""
+    st = {k: history().get(k) for k in ("last_mode", "last_viewpoint_思想", "last_viewpoint_身体")}
+    slots = []
+    for _ in range(days):
+        mode = next_mode(st.get)
+        viewpoint = next_viewpoint(mode, st.get)
+        slots.append((mode, viewpoint))
+        st.update(rotation_updates(mode, viewpoint))
+    return slots
+
+def missing_slots():
+    # 先 QUEUE_DAYS 回分のうち、キューに足りない枠
+    need = Counter(planned_slots(QUEUE_DAYS))
+    have = history().queued_counts()
+    return [slot for slot, n in need.items() for _ in range(n - have.get(slot, 0))]
+
+def accept_for_queue(text: str, avoid_words):
+    """採点して問題が無く、過去投稿ともキュー内の文ともかぶらない文だけキューに入れる"""
+    problems, _ = check_candidate(text, avoid_words)
+    queued = [t for m, v in history().queued_counts() for _, t in history().queued(m, v)]
+    sim = max((dedup().similarity(text, t) for t in queued), default=0.0)
+    if sim >= dedup().threshold:
+        problems.append(f"作り置きと類似({sim:.2f})")
+    if problems:
+        print(f"作り置き不採用: {'、'.join(problems)}")
+        return False
+    return True
+
+def submit_batch(slots):
+    # 足りない枠の下書きを Batch API で1ジョブにまとめて頼む（結果は collect_batch で回収）
+    types = clients.genai_types()
+    avoids = [dynamic_avoid_words() for _ in slots]
+    requests = [
+        types.InlinedRequest(
+            contents=draft_prompt(mode, viewpoint, avoid),
+            config=types.GenerateContentConfig(
+                temperature=GEMINI_TEMP_DRAFT,
+                candidate_count=GEMINI_CANDIDATES if GEMINI_CANDIDATES > 1 else None,
+            ),
+        )
+        for (mode, viewpoint), avoid in zip(slots, avoids)
+    ]
+    with metrics.timer("gemini_batch_submit"):
+        job = clients.get_genai_client().batches.create(
+            model=MODEL_NAME, src=requests, config={"display_name": "auto_gen_x-queue"}
+        )
+    history().update_state(queue_batch={
+        "name": job.name,
+        "submitted_at": datetime.now(TZ).isoformat(timespec="seconds"),
+        "slots": [list(slot) for slot in slots],
+        "avoids": avoids,
+    })
+    print(f"作り置き：Batch API に{len(slots)}件依頼（{job.name}）")
+
+def collect_batch():
+    """依頼中の Batch ジョブが終わっていれば結果をキューに入れる。まだなら True（依頼中）"""
+    pending = history().get("queue_batch")
+    if not pending:
+        return False
+    with metrics.timer("gemini_batch_get"):
+        job = clients.get_genai_client().batches.get(name=pending["name"])
+    state = getattr(job.state, "name", str(job.state))
+    if state not in ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED", "JOB_STATE_FAILED",
+                     "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"):
+        return True
+
+    responses = (getattr(job.dest, "inlined_responses", None) or []) if job.dest else []
+    added = 0
+    now = datetime.now(TZ).isoformat(timespec="seconds")
+    # 結果は依頼と同じ順に並ぶ
+    for (mode, viewpoint), avoid, res in zip(pending["slots"], pending["avoids"], responses):
+        if res.error or not res.response:
+            continue
+        candidates = [remove_consecutive_duplicate_lines(candidate_text(c)) for c in (res.response.candidates or [])]
+        text, _ = pick_candidate(candidates, avoid)
+        if text and accept_for_queue(text, avoid):
+            history().enqueue(now, mode, viewpoint, text)
+            added += 1
+    history().update_state(queue_batch=None)
+    print(f"作り置き：Batch 回収 {state} / {added}件追加")
+    return False
+
+def fill_queue():
+    """先 QUEUE_DAYS 回分の完成文を作り置きする（投稿と同じ生成・採点を通したものだけ）"""
+    cutoff = (datetime.now(TZ) - timedelta(days=QUEUE_MAX_AGE_DAYS)).isoformat(timespec="seconds")
+    history().drop_queued(before=cutoff)
+
+    if QUEUE_BATCH and collect_batch():
+        print("作り置き：Batch ジョブ処理中なので今回は待つ")
+        return
+    slots = missing_slots()
+    if not slots:
+        print(f"作り置き：先{QUEUE_DAYS}回分そろっています")
+        return
+    if QUEUE_BATCH:
+        submit_batch(slots)
+        return
+
+    gemini_client = clients.get_genai_client()
+    for mode, viewpoint in slots:
+        avoid_words = dynamic_avoid_words()
+        try:
+            text = compose(gemini_client, mode, viewpoint, avoid_words)
+        except Exception as e:
+            print(f"作り置き生成エラー: {e}")
+            continue
+        if text and accept_for_queue(text, avoid_words):
+            history().enqueue(datetime.now(TZ).isoformat(timespec="seconds"), mode, viewpoint, text)
+            print(f"作り置き追加: {mode} / {viewpoint}")
+
+def dequeue(mode: str, viewpoint: str):
+    """今回の枠の作り置きを (id, 文) で返す。投稿済みとほぼ同じになったものは捨てる。無ければ None"""
+    if QUEUE_BATCH:
+        try:
+            collect_batch()
+        except Exception as e:
+            print(f"batch collect error: {e}")
+    for queue_id, text in history().queued(mode, viewpoint):
+        sim, day = dedup().query(text, DEDUP_SCOPE)
+        if sim < dedup().threshold:
+            return queue_id, text
+        print(f"作り置きを破棄：過去の投稿（{day}）とほぼ同じ（類似度 {sim:.2f}）")
+        history().drop_queued(queue_id)
+    return None
+
 def job():
+    """途中で止まったスレッドが残っていれば False（scheduler が RETRY_SEC 後に続きから再開する）"""
     # ---- 1日1回ガード（最初に判定） ----
     today = datetime.now(TZ).date()
     if last_post_date() == today:
         print("🛑 今日はすでに投稿済みなのでスキップ")
         return
 
+    # ---- 途中まで出したスレッドがあれば、生成せずに続きだけ出す ----
+    jkey = journal.thread_key("auto_gen_x", today)
+    entry = journal.get(jkey)
+    if entry:
+        print(f"--- 投稿再開(JST): {len(entry['ids'])}/{len(entry['parts'])}件投稿済み ---")
+        return post_thread(jkey)
+
     print(f"--- 投稿開始(JST): {datetime.now(TZ).strftime('%Y-%m-%d %H:%M:%S')} ---")
 
     missing = [k for k in ["API_KEY","API_SECRET","ACCESS_TOKEN","ACCESS_TOKEN_SECRET","GEMINI_API_KEY"] if not os.getenv(k)]
@@ -325,16 +599,28 @@ def job():
         return
 
     try:
-        gemini_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        gemini_client = clients.get_genai_client()
 
         # 思想⇄身体を交互
         mode = next_mode()
         viewpoint = next_viewpoint(mode)
         print(f"【今回】mode={mode} / viewpoint={viewpoint}")
 
-        draft = gemini_draft(gemini_client, mode=mode, viewpoint=viewpoint)
-        final = gemini_polish(gemini_client, draft)
-        final = remove_consecutive_duplicate_lines(final)
+        # 作り置きがあればそれを使う（Gemini は呼ばない）
+        queued = dequeue(mode, viewpoint) if QUEUE_DAYS else None
+        queue_id = None
+        if queued:
+            queue_id, final = queued
+            print("【作り置き】を使用")
+        else:
+            avoid_words = dynamic_avoid_words()
+            # 過去の投稿とほぼ同じ文になったら作り直す（DUP_RETRY 回まで）
+            for _ in range(1 + DUP_RETRY):
+                final = compose(gemini_client, mode, viewpoint, avoid_words)
+                sim, day = dedup().query(final, DEDUP_SCOPE) if final else (0.0, None)
+                if sim < dedup().threshold:
+                    break
+                print(f"過去の投稿（{day}）とほぼ同じ（類似度 {sim:.2f}）→ 作り直し")
 
         if not final:
             final = "ちゃんとしすぎる人ほど、体が先に止まる。"
@@ -346,24 +632,10 @@ def job():
             print("生成失敗（空）")
             return
 
-        client_x = tweepy.Client(
-            consumer_key=os.getenv("API_KEY"),
-            consumer_secret=os.getenv("API_SECRET"),
-            access_token=os.getenv("ACCESS_TOKEN"),
-            access_token_secret=os.getenv("ACCESS_TOKEN_SECRET")
-        )
-
-        first = client_x.create_tweet(text=parts[0])
-        last_id = first.data["id"]
-
-        for p in parts[1:]:
-            resp = client_x.create_tweet(text=p, in_reply_to_tweet_id=last_id)
-            last_id = resp.data["id"]
-
-        print(f"✅ 投稿成功！（{len(parts)}ツリー）")
-
-        # ---- 成功したら今日投稿済みにする ----
-        mark_posted_today()
+        journal.begin(jkey, [{"text": p} for p in parts], meta={
+            "day": today.isoformat(), "mode": mode, "viewpoint": viewpoint, "text": final, "queue_id": queue_id,
+        })
+        return post_thread(jkey)
 
     except Exception as e:
         print(f"エラー: {e}")
@@ -371,69 +643,61 @@ def job():
 # =========================
 # JST固定：毎日「指定時刻（±揺らぎ）」の実行時刻を作る
 # =========================
-def parse_hhmm(hhmm: str):
-    h, m = map(int, hhmm.split(":"))
-    return h, m
-
-def make_jittered_run_times_for_date(day_date):
-    runs = []
-    for base in POST_TIMES:
-        h, m = parse_hhmm(base)
-        base_dt = datetime(day_date.year, day_date.month, day_date.day, h, m, tzinfo=TZ)
-        offset = random.randint(-JITTER_MINUTES, JITTER_MINUTES)
-        run_dt = base_dt + timedelta(minutes=offset)
-        runs.append((base, run_dt))
-    runs.sort(key=lambda x: x[1])
-    return runs
-
 def print_today_schedule(runs):
     s = ", ".join([f"{b}→{dt.strftime('%H:%M')}" for b, dt in runs])
-    print(f"📌 本日の投稿時刻（JST/揺らぎ適用）: {s}")
+    print(f"📌 本日の実行時刻（JST/揺らぎ適用）: {s}")
 
 # =========================
 # 起動（scheduleを使わない）
 # =========================
-print(f"JST固定 起動完了（1日{len(POST_TIMES)}回 / 130字×最大2 / 思想⇄身体交互）")
-print(f"揺らぎ：±{JITTER_MINUTES}分 / 基準時刻: {POST_TIMES}")
-print(f"DEPLOY_RUN: {DEPLOY_RUN}")
-print(f"LAST_POST_DATE: {last_post_date()}")
-
-# デプロイ時に即投稿（任意）
-# ※ 1日1回ガードがあるので、同日に二重投稿は起きない
-if DEPLOY_RUN:
-    job()
-
-today = datetime.now(TZ).date()
-runs = make_jittered_run_times_for_date(today)
-print_today_schedule(runs)
-
-done = set()  # run_dt.isoformat() を入れる（その日の予定枠の実行済み）
-
-while True:
+# 次の予定時刻（揺らぎ込み）までちょうど眠る。過ぎた枠は起動直後に取り逃し救済
+def run_slot(base, run_dt, late):
     now = datetime.now(TZ)
-
-    # 日付が変わったら翌日分を作り直す
-    if now.date() != today:
-        today = now.date()
-        runs = make_jittered_run_times_for_date(today)
-        done.clear()
-        print_today_schedule(runs)
-
-    for base, run_dt in runs:
-        key = run_dt.isoformat()
-        if key in done:
-            continue
-
-        # run_dt〜run_dt+5分の間に拾えればOK
-        if run_dt <= now <= (run_dt + timedelta(minutes=5)):
-            print(f"⏰ 実行(JST): base={base} / run={run_dt.strftime('%H:%M')} / now={now.strftime('%H:%M:%S')}")
-            job()
-            done.add(key)
-
+    if QUEUE_DAYS and base == QUEUE_FILL_TIME:
+        # 作り置きの補充。起動が遅れて今日の投稿枠も過ぎているなら、投稿を先にする（補充は翌日の枠で）
+        if late and last_post_date() != now.date() and now.strftime("%H:%M") >= min(POST_TIMES):
+            print("作り置き：今日の投稿前なので補充は見送り")
+            return
+        try:
+            fill_queue()
+        except Exception as e:
+            print(f"作り置きエラー: {e}")
+        return
+    if late:
         # 取り逃し救済（ただし job() 内で1日1回ガードが効く）
-        elif now > (run_dt + timedelta(minutes=5)):
-            print(f"⚠️ 取り逃し救済(JST): base={base} / run={run_dt.strftime('%H:%M')} / now={now.strftime('%H:%M:%S')}")
-            job()
-            done.add(key)
+        print(f"⚠️ 取り逃し救済(JST): base={base} / run={run_dt.strftime('%H:%M')} / now={now.strftime('%H:%M:%S')}")
+    else:
+        print(f"⏰ 実行(JST): base={base} / run={run_dt.strftime('%H:%M')} / now={now.strftime('%H:%M:%S')}")
+    return job()
+
+def run_bot():
+    print(f"JST固定 起動完了（1日{len(POST_TIMES)}回 / 130字×最大2 / 思想⇄身体交互）")
+    print(f"揺らぎ：±{JITTER_MINUTES}分 / 基準時刻: {POST_TIMES}")
+    print(f"DEPLOY_RUN: {DEPLOY_RUN}")
+    if QUEUE_DAYS:
+        print(f"作り置き: 先{QUEUE_DAYS}回分 / 補充 {QUEUE_FILL_TIME} / Batch API: {QUEUE_BATCH}")
+    print(f"LAST_POST_DATE: {last_post_date()}")
+    metrics.start_server()
+
+    # デプロイ時に即投稿（任意）
+    # ※ 1日1回ガードがあるので、同日に二重投稿は起きない
+    if DEPLOY_RUN:
+        job()
+
+    scheduler = DailyScheduler(
+        POST_TIMES + ([QUEUE_FILL_TIME] if QUEUE_DAYS else []), TZ,
+        jitter_minutes=JITTER_MINUTES,
+        window_minutes=5,
+        retry_sec=RETRY_SEC,
+        on_plan=print_today_schedule,
+        name="auto_gen_x",
+    )
+    # 途中で止まったスレッドが残っていれば（再起動など）、投稿枠を待たずに続きから再開する
+    today = datetime.now(TZ).date()
+    if journal.get(journal.thread_key("auto_gen_x", today)):
+        scheduler.plan(today)
+        scheduler.retry_in(0, base="resume")
+    scheduler.run_forever(run_slot)
 
-    time.sleep(20)
+if __name__ == "__main__":
+    run_bot()
@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+import forecast_rules as rules
+import pressure_features
+
+# =========================
+# 基本設定
+# =========================
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+ARCHIVE_VARS = ["surface_pressure", "temperature_2m", "dewpoint_2m"]
+
+# 列ごとのファイル名（float32 の .npy、memmap で読む）
+COLUMNS = {
+    "surface_pressure": "pressure.npy",
+    "temperature_2m": "temp.npy",
+    "dewpoint_2m": "dew.npy",
+}
+
+# =========================
+# アーカイブ（列ごとの .npy ＋ meta.json）
+# =========================
+def write_archive(out_dir, start_date, columns):
+    """
+    start_date の0時から1時間刻みで並んだ列を保存する。
+    columns: {"surface_pressure": [...], "temperature_2m": [...], "dewpoint_2m": [...]}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n = None
+    for key, fname in COLUMNS.items():
+        arr = np.asarray([np.nan if v is None else v for v in columns[key]], dtype=np.float32)
+        n = len(arr) if n is None else min(n, len(arr))
+        np.save(os.path.join(out_dir, fname), arr)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"start_date": start_date.isoformat(), "hours": n}, f)
+
+def load_archive(archive_dir):
+    with open(os.path.join(archive_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    cols = {
+        key: np.load(os.path.join(archive_dir, fname), mmap_mode="r")[:meta["hours"]]
+        for key, fname in COLUMNS.items()
+    }
+    return date.fromisoformat(meta["start_date"]), cols
+
+def import_json(out_dir, paths):
+    """
+    Open-Meteo 形式の JSON（hourly.time ほか）を日付順につなげてアーカイブにする。
+    重複する時刻は後のファイルを優先する。
+    """
+    rows = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            hourly = json.load(f)["hourly"]
+        for i, t in enumerate(hourly["time"]):
+            rows[t] = tuple(hourly[k][i] for k in COLUMNS)
+
+    times = sorted(rows)
+    first = datetime.fromisoformat(times[0])
+    last = datetime.fromisoformat(times[-1])
+    n = int((last - first).total_seconds() // 3600) + 1
+
+    # 欠けている時刻は NaN で埋めて等間隔にする
+    filled = {k: [None] * n for k in COLUMNS}
+    for t, vals in rows.items():
+        i = int((datetime.fromisoformat(t) - first).total_seconds() // 3600)
+        for k, v in zip(COLUMNS, vals):
+            filled[k][i] = v
+
+    write_archive(out_dir, first.date(), filled)
+    return n
+
+def fetch_archive(out_dir, lat, lon, start, end):
+    # 過去データを Open-Meteo の archive API から取得して保存
+    from weather_cache import get_session
+
+    r = get_session().get(ARCHIVE_URL, params={
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "hourly": ",".join(ARCHIVE_VARS),
+        "timezone": "Asia/Tokyo",
+    }, timeout=120)
+    r.raise_for_status()
+    hourly = r.json()["hourly"]
+    write_archive(out_dir, start, {k: hourly[k] for k in COLUMNS})
+    return len(hourly["time"])
+
+# =========================
+# 一括判定（全日をまとめてベクトル演算）
+# =========================
+def evaluate(start_date, cols, first=None, last=None, use_features=False):
+    """
+    post_forecast と同じ 6/12/18/24時サンプリングと判定を、全日まとめて計算する。
+    必要な時刻が欠けている日は除外する。
+    use_features=True なら 6〜24時の毎時データの急な下降（pressure_features）も判定に入れる。
+    """
+    pressure = cols["surface_pressure"]
+    temp = cols["temperature_2m"]
+    dew = cols["dewpoint_2m"]
+
+    n_days = (len(pressure) - 1) // 24
+    d0 = 0 if first is None else max((first - start_date).days, 0)
+    d1 = n_days if last is None else min((last - start_date).days + 1, n_days)
+    if d1 <= d0:
+        return None
+
+    hours = np.array((rules.BASE_HOUR,) + rules.SAMPLE_HOURS)
+    idx = np.arange(d0, d1)[:, None] * 24 + hours[None, :]
+
+    p = np.rint(np.asarray(pressure)[idx]).astype(np.float64)
+    t = np.asarray(temp)[idx[:, 1:]].astype(np.float64)
+    dw = np.nan_to_num(np.asarray(dew)[idx[:, 1:]].astype(np.float64), nan=0.0)
+
+    ok = ~(np.isnan(p).any(axis=1) | np.isnan(t).any(axis=1))
+    p, t, dw = p[ok], t[ok], dw[ok]
+    days = np.arange(d0, d1)[ok]
+
+    day_range = p.max(axis=1) - p.min(axis=1)
+    delta = p[:, -1] - p[:, 0]
+    high = (day_range >= rules.RANGE_HIGH) | (np.abs(delta) >= rules.DELTA_HIGH)
+    mid = (day_range >= rules.RANGE_MID) | (np.abs(delta) >= rules.DELTA_MID)
+    pressure_level = np.where(high, 2, np.where(mid, 1, 0))
+
+    if use_features:
+        span = np.arange(rules.BASE_HOUR, 25)
+        widx = days[:, None] * 24 + span[None, :]
+        feats = pressure_features.extract(np.asarray(pressure)[widx])
+        pressure_level = np.maximum(pressure_level, pressure_features.feature_level(feats))
+
+    temp_range = np.rint(t.max(axis=1) - t.min(axis=1))
+    dew_max = np.rint(dw.max(axis=1))
+    amp = (temp_range >= rules.TEMP_RANGE_AMP).astype(int) + (dew_max >= rules.DEW_MAX_AMP).astype(int)
+
+    return {
+        "days": days,
+        "pressure_level": pressure_level,
+        "total_level": pressure_level + amp,
+        "range": day_range,
+        "delta": delta,
+        "skipped": int((~ok).sum()),
+    }
+
+def report(start_date, result):
+    n = len(result["days"])
+    print(f"対象日数: {n}（欠損で除外 {result['skipped']}日）")
+    if n == 0:
+        return
+
+    print("\n[気圧判定]")
+    counts = np.bincount(result["pressure_level"], minlength=3)
+    for lv, label in enumerate(rules.PRESSURE_LABELS):
+        print(f"  {label:<6} {counts[lv]:>6}日 ({counts[lv] / n:6.1%})")
+
+    print("\n[total_level]")
+    counts = np.bincount(result["total_level"], minlength=5)
+    for lv, c in enumerate(counts):
+        print(f"  {lv} ({rules.closing_style(lv)}) {c:>6}日 ({c / n:6.1%})")
+
+    print("\n[年ごとの 変化大 / total_level>=4]")
+    years = (np.datetime64(start_date, "D") + result["days"]).astype("datetime64[Y]").astype(int) + 1970
+    for y in np.unique(years):
+        m = years == y
+        big = int((result["pressure_level"][m] == 2).sum())
+        strong = int((result["total_level"][m] >= 4).sum())
+        print(f"  {y}: {big:>4} / {strong:>4}  （{int(m.sum())}日）")
+
+# =========================
+# CLI
+#   python backtest.py import <dir> <json...>
+#   python backtest.py fetch <dir> <lat> <lon> <YYYY-MM-DD> <YYYY-MM-DD>
+#   python backtest.py run <dir> [YYYY-MM-DD] [YYYY-MM-DD] [--features]
+# =========================
+def main(argv):
+    if len(argv) < 2:
+        print("usage: backtest.py import|fetch|run <dir> ...")
+        return 1
+
+    use_features = "--features" in argv
+    argv = [a for a in argv if a != "--features"]
+    cmd, archive_dir = argv[0], argv[1]
+    if cmd == "import":
+        n = import_json(archive_dir, argv[2:])
+        print(f"{n}時間分を保存: {archive_dir}")
+    elif cmd == "fetch":
+        lat, lon = float(argv[2]), float(argv[3])
+        n = fetch_archive(archive_dir, lat, lon, date.fromisoformat(argv[4]), date.fromisoformat(argv[5]))
+        print(f"{n}時間分を保存: {archive_dir}")
+    elif cmd == "run":
+        first = date.fromisoformat(argv[2]) if len(argv) > 2 else None
+        last = date.fromisoformat(argv[3]) if len(argv) > 3 else None
+
+        t0 = time.perf_counter()
+        start_date, cols = load_archive(archive_dir)
+        t1 = time.perf_counter()
+        result = evaluate(start_date, cols, first, last, use_features=use_features)
+        t2 = time.perf_counter()
+
+        if result is None:
+            print("対象期間にデータがありません")
+            return 1
+        report(start_date, result)
+        print(f"\n読み込み {1000 * (t1 - t0):.1f}ms / 判定 {1000 * (t2 - t1):.1f}ms")
+    else:
+        print("unknown command:", cmd)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,166 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+from bench_fakes import (
+    CallLog, Latency, FakeGenaiClient, FakeXClient, FakeXAPI, start_open_meteo,
+)
+
+# =========================
+# 3つのBOTの1回分の処理を、外部APIを偽物に差し替えて計測する
+#   python bench_bots.py --runs 20 --gemini-ms 800 --x-ms 150 --weather-ms 200 --error-rate 0.02
+# 状態ファイル・キャッシュは一時ディレクトリに作る（本番のファイルには触らない）
+# =========================
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_args(argv):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--gemini-ms", type=float, default=800)
+    ap.add_argument("--x-ms", type=float, default=150)
+    ap.add_argument("--weather-ms", type=float, default=200)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--locations", default="all", help="PRESSURE_LOCATIONS と同じ書式")
+    ap.add_argument("--retweeters", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    return ap.parse_args(argv)
+
+def setup_env(work_dir, args):
+    # BOT の import 前に設定する（モジュール読み込み時に getenv するため）
+    os.environ.update({
+        "PRESSURE_STATE_PATH": os.path.join(work_dir, "pressure_state.json"),
+        "PRESSURE_LOCATIONS": args.locations,
+        "WEATHER_CACHE_DIR": os.path.join(work_dir, "weather_cache"),
+        "WEATHER_CACHE_TTL_SEC": "0",
+        "MEDIA_CACHE_PATH": os.path.join(work_dir, "media_cache.json"),
+        "MEDIA_CACHE_DIR": os.path.join(work_dir, "media_cache"),
+        "RATE_LIMIT_STATE_PATH": os.path.join(work_dir, "rate_limit_state.json"),
+        "GEMINI_LATENCY_PATH": os.path.join(work_dir, "gemini_latency.json"),
+        "PRESSURE_JOURNAL_PATH": os.path.join(work_dir, "pressure_journal.json"),
+        "LIKE_MIN_INTERVAL_SEC": "0",
+    })
+    for k in ["API_KEY", "API_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET", "X_BEARER_TOKEN", "GEMINI_API_KEY"]:
+        os.environ.setdefault(k, "bench")
+
+def wrap(module, name, log, label):
+    # module.name を所要時間つきの関数に差し替える（呼び出し側はグローバル名で引くのでそのまま効く）
+    fn = getattr(module, name)
+
+    def timed(*a, **kw):
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            out = fn(*a, **kw)
+            ok = True
+            return out
+        finally:
+            log.record(label, time.perf_counter() - t0, ok)
+
+    setattr(module, name, timed)
+
+def percentile(samples, q):
+    s = sorted(samples)
+    if not s:
+        return float("nan")
+    k = (len(s) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+def print_table(title, log):
+    print(f"\n[{title}]")
+    print(f"  {'stage':<34} {'n':>5} {'err':>4} {'p50(ms)':>9} {'p90(ms)':>9} {'p99(ms)':>9}")
+    for name in sorted(log.samples):
+        xs = log.samples[name]
+        print(
+            f"  {name:<34} {len(xs):>5} {log.errors.get(name, 0):>4} "
+            f"{percentile(xs, 0.5) * 1000:>9.1f} {percentile(xs, 0.9) * 1000:>9.1f} {percentile(xs, 0.99) * 1000:>9.1f}"
+        )
+
+def main(argv):
+    args = parse_args(argv)
+    work_dir = tempfile.mkdtemp(prefix="bench_bots_")
+    setup_env(work_dir, args)
+    # auto_gen_x の履歴ファイルはカレント相対なので、一時ディレクトリで動かす
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(work_dir)
+
+    log = CallLog()
+    gemini = Latency(args.gemini_ms, error_rate=args.error_rate, seed=args.seed)
+    x = Latency(args.x_ms, error_rate=args.error_rate, seed=args.seed + 1)
+    weather = Latency(args.weather_ms, error_rate=args.error_rate, seed=args.seed + 2)
+    fake_gen = FakeGenaiClient(gemini, log)
+    fake_x = FakeXClient(x, log, retweeters=args.retweeters)
+    fake_api = FakeXAPI(x, log)
+    server, url = start_open_meteo(weather, log)
+
+    import clients
+    import weather_cache
+    import pressure_forecast_bot as pressure
+    import auto_gen_x
+    import sendai_target_search as sendai
+
+    weather_cache.OPEN_METEO_URL = url
+    clients.set_client("x_client", fake_x)
+    clients.set_client("x_api_v1", fake_api)
+    clients.set_client("genai", fake_gen)
+
+    wrap(pressure, "fetch_weather", log, "pressure.fetch_weather")
+    wrap(pressure, "build_materials", log, "pressure.build_materials")
+    wrap(pressure, "gemini_generate", log, "pressure.gemini_generate")
+    wrap(pressure, "upload_banner", log, "pressure.upload_banner")
+    wrap(pressure, "create_part", log, "pressure.create_part")
+    wrap(pressure, "post_thread", log, "pressure.post_thread")
+    wrap(auto_gen_x, "gemini_draft", log, "auto_gen_x.gemini_draft")
+    wrap(auto_gen_x, "gemini_drafts", log, "auto_gen_x.gemini_drafts")
+    wrap(auto_gen_x, "gemini_polish", log, "auto_gen_x.gemini_polish")
+    wrap(sendai, "classify_profiles", log, "sendai.classify_profiles")
+
+    e2e = CallLog()
+    first_tweet = []
+    bots = [
+        ("pressure.post_forecast", lambda: pressure.post_forecast(force=True)),
+        ("auto_gen_x.job", auto_gen_x.job),
+        ("sendai.crawl_once", lambda: sendai.crawl_once(0)),
+    ]
+
+    # BOT の print は計測の邪魔なので捨てる
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    try:
+        for _ in range(args.runs):
+            # 毎回「今日はまだ投稿していない」状態から始める
+            with pressure.state.transaction() as st:
+                st.clear()
+            auto_gen_x.history().update_state(last_post_date=None)
+
+            for name, fn in bots:
+                log.first_tweet_at = None
+                t0 = time.perf_counter()
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    fn()
+                finally:
+                    sys.stdout = stdout
+                e2e.record(name, time.perf_counter() - t0, True)
+                if name != "sendai.crawl_once" and log.first_tweet_at is not None:
+                    first_tweet.append((name, log.first_tweet_at - t0))
+    finally:
+        devnull.close()
+        server.shutdown()
+
+    for name, sec in first_tweet:
+        e2e.record(f"{name} (最初の投稿まで)", sec, True)
+
+    print(f"runs={args.runs} gemini={args.gemini_ms}ms x={args.x_ms}ms weather={args.weather_ms}ms "
+          f"error_rate={args.error_rate} locations={args.locations}")
+    print_table("外部API（偽物）", SimpleNamespace(samples={k: v for k, v in log.samples.items() if "." in k and k.split(".")[0] in ("gemini", "x", "open_meteo")}, errors=log.errors))
+    print_table("BOT内の段階", SimpleNamespace(samples={k: v for k, v in log.samples.items() if k.split(".")[0] in ("pressure", "auto_gen_x", "sendai")}, errors=log.errors))
+    print_table("1回分の処理（end-to-end）", e2e)
+    print(f"\n作業ディレクトリ: {work_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
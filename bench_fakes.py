@@ -0,0 +1,200 @@
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+# =========================
+# ベンチマーク用の偽クライアント（Gemini / X / Open-Meteo）
+# =========================
+TZ = ZoneInfo("Asia/Tokyo")
+
+class Latency:
+    """
+    遅延と失敗の分布。median_ms を中央値とする対数正規分布で待ち、error_rate の確率で例外を投げる。
+    """
+
+    def __init__(self, median_ms, sigma=0.5, error_rate=0.0, seed=None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def wait(self, name):
+        with self.lock:
+            ms = self.median_ms * self.rnd.lognormvariate(0, self.sigma) if self.median_ms > 0 else 0
+            fail = self.rnd.random() < self.error_rate
+        time.sleep(ms / 1000)
+        if fail:
+            raise RuntimeError(f"fake {name} error")
+
+class CallLog:
+    # 偽クライアントの呼び出しごとの所要時間（秒）と失敗回数
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.first_tweet_at = None
+
+    def record(self, name, sec, ok):
+        with self.lock:
+            self.samples.setdefault(name, []).append(sec)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def timed(self, name, latency, fn):
+        t0 = time.perf_counter()
+        try:
+            latency.wait(name)
+            out = fn()
+        except Exception:
+            self.record(name, time.perf_counter() - t0, False)
+            raise
+        self.record(name, time.perf_counter() - t0, True)
+        return out
+
+# =========================
+# Gemini（genai.Client 相当）
+# =========================
+SAMPLE_BODY = (
+    "今日は朝から気圧がゆるやかに下がり、夕方にかけて頭が重く感じやすい一日です。"
+    "空気はしっとりして、肌に少しまとわりつくような感覚があるかもしれません。"
+    "こまめに首や肩をゆるめて、深い呼吸を意識してお過ごしください。"
+)
+
+class FakeModels:
+    def __init__(self, latency, log):
+        self.latency = latency
+        self.log = log
+
+    def generate_content(self, model=None, contents=None, config=None):
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False, default=str)
+        if getattr(config, "response_mime_type", None) == "application/json":
+            # まとめて判定：聞かれた id ごとに true/false を返す
+            ids = re.findall(r'"id": "([^"]+)"', prompt)
+            text = json.dumps([{"id": i, "target": random.random() < 0.5} for i in ids])
+        elif "YES" in prompt and "NO" in prompt:
+            text = random.choice(["YES", "NO"])
+        else:
+            text = SAMPLE_BODY
+        # candidate_count を指定されたら、少しずつ違う候補を返す
+        n = getattr(config, "candidate_count", None) or 1
+        sentences = [s + "。" for s in text.split("。") if s]
+        candidates = [
+            SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text="".join(sentences[i % len(sentences):]))]))
+            for i in range(n)
+        ]
+        return self.log.timed("gemini.generate_content", self.latency,
+                              lambda: SimpleNamespace(text=text, candidates=candidates))
+
+class FakeGenaiClient:
+    def __init__(self, latency, log):
+        self.models = FakeModels(latency, log)
+
+# =========================
+# X（tweepy.Client / tweepy.API 相当）
+# =========================
+class FakeXClient:
+    def __init__(self, latency, log, retweeters=100):
+        self.latency = latency
+        self.log = log
+        self.retweeters = retweeters
+        self._next_id = 1000
+        self._lock = threading.Lock()
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return str(self._next_id)
+
+    def create_tweet(self, text=None, in_reply_to_tweet_id=None, media_ids=None, user_auth=True):
+        def done():
+            if in_reply_to_tweet_id is None:
+                with self.log.lock:
+                    if self.log.first_tweet_at is None:
+                        self.log.first_tweet_at = time.perf_counter()
+            return SimpleNamespace(data={"id": self._new_id(), "text": text})
+        return self.log.timed("x.create_tweet", self.latency, done)
+
+    def get_user(self, username=None, **kwargs):
+        return self.log.timed("x.get_user", self.latency,
+                              lambda: SimpleNamespace(data=SimpleNamespace(id="42", username=username)))
+
+    def get_users_tweets(self, user_id, max_results=5, **kwargs):
+        tweets = [SimpleNamespace(id=str(9000 + i)) for i in range(max_results)]
+        return self.log.timed("x.get_users_tweets", self.latency, lambda: SimpleNamespace(data=tweets))
+
+    def get_retweeters(self, tweet_id, user_fields=None, **kwargs):
+        descs = ["仙台・太白区在住。肩こりと頭痛がつらい", "東京の会社員", "", "青葉区｜自律神経ゆらぎがち", "猫と写真"]
+        users = [
+            SimpleNamespace(id=str(5000 + i), username=f"user{i}", description=descs[i % len(descs)])
+            for i in range(self.retweeters)
+        ]
+        return self.log.timed("x.get_retweeters", self.latency, lambda: SimpleNamespace(data=users))
+
+    def like(self, tweet_id, **kwargs):
+        return self.log.timed("x.like", self.latency, lambda: SimpleNamespace(data={"liked": True}))
+
+class FakeXAPI:
+    def __init__(self, latency, log):
+        self.latency = latency
+        self.log = log
+
+    def media_upload(self, filename, **kwargs):
+        media = SimpleNamespace(media_id=777, media_id_string="777", expires_after_secs=86400)
+        return self.log.timed("x.media_upload", self.latency, lambda: media)
+
+# =========================
+# Open-Meteo（ローカルHTTPサーバ）
+# =========================
+def fake_forecast(lat, lon, days=2, seed=0):
+    rnd = random.Random(f"{lat},{lon},{seed}")
+    start = datetime.now(TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+    n = 24 * days
+    p = 1012.0
+    hourly = {"time": [], "surface_pressure": [], "temperature_2m": [],
+              "relative_humidity_2m": [], "dewpoint_2m": []}
+    for i in range(n):
+        p += rnd.gauss(-0.1, 0.6)
+        hourly["time"].append((start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M"))
+        hourly["surface_pressure"].append(round(p, 1))
+        hourly["temperature_2m"].append(round(12 + 6 * rnd.random(), 1))
+        hourly["relative_humidity_2m"].append(rnd.randint(40, 95))
+        hourly["dewpoint_2m"].append(round(8 + 8 * rnd.random(), 1))
+    return {"latitude": lat, "longitude": lon, "hourly": hourly}
+
+def start_open_meteo(latency, log):
+    """偽の Open-Meteo を 127.0.0.1 の空きポートで起動し、(server, url) を返す"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            q = parse_qs(urlparse(self.path).query)
+            lats = q.get("latitude", ["38.27"])[0].split(",")
+            lons = q.get("longitude", ["140.87"])[0].split(",")
+            try:
+                body = log.timed("open_meteo.forecast", latency, lambda: [
+                    fake_forecast(float(a), float(b)) for a, b in zip(lats, lons)
+                ])
+            except RuntimeError:
+                self.send_response(503)
+                self.end_headers()
+                return
+            data = json.dumps(body[0] if len(body) == 1 else body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/forecast"
@@ -0,0 +1,75 @@
+import random
+import time
+
+import segmenter
+
+# =========================
+# 分割エンジンのマイクロベンチマーク
+#   python bench_segmenter.py
+# =========================
+SAMPLE_SENTENCES = [
+    "今日は気圧の変化が大きく、頭が重く感じやすい一日です。",
+    "首や肩の力みに気づいたら、ゆっくり息を吐いてみてください。",
+    "Open-Meteo の予報では 12時に 1008hPa まで下がります！",
+    "無理をせず、こまめに休みましょう",
+    "体が先に止まるのは、守りの反応です？",
+    "詳しくは https://example.com/pressure を見てください。",
+]
+
+def make_text(n_chars, seed=0):
+    rnd = random.Random(seed)
+    out = []
+    total = 0
+    while total < n_chars:
+        s = rnd.choice(SAMPLE_SENTENCES)
+        out.append(s)
+        total += len(s)
+    return "".join(out)[:n_chars]
+
+def legacy_split(text, limit=135):
+    # 置き換え前の split_by_sentence（比較用）
+    text = (text or "").strip()
+    if not text:
+        return []
+    parts = []
+    rest = text
+    while rest:
+        if len(rest) <= limit:
+            parts.append(rest)
+            break
+        window = rest[:limit]
+        cut = max(
+            window.rfind("。"),
+            window.rfind("！"),
+            window.rfind("？"),
+            window.rfind("、"),
+            window.rfind(" "),
+        )
+        if cut < 10:
+            cut = limit
+        take_len = cut + (1 if cut != limit else 0)
+        parts.append(rest[:take_len].strip())
+        rest = rest[take_len:].strip()
+    return [p for p in parts if p]
+
+def bench(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    print(f"{'chars':>8} {'segment(ms)':>12} {'legacy(ms)':>12} {'parts':>6} {'max_w':>6}")
+    for n in [300, 3_000, 30_000, 300_000]:
+        text = make_text(n)
+        repeat = 20 if n <= 30_000 else 3
+        t_new = bench(lambda t: segmenter.segment(t, 270), text, repeat)
+        t_old = bench(legacy_split, text, repeat)
+        parts = segmenter.segment(text, 270)
+        max_w = max(segmenter.weighted_length(p) for p in parts)
+        print(f"{n:>8} {t_new * 1000:>12.2f} {t_old * 1000:>12.2f} {len(parts):>6} {max_w:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import threading
+
+# =========================
+# APIクライアントの遅延生成
+#   tweepy / google.genai は import だけで1秒近くかかるので、
+#   最初に使う時に import・生成し、以降はプロセス内で使い回す
+# =========================
+_lock = threading.RLock()
+_clients = {}
+# エンドポイントごとの最短間隔（秒）。limiter の生成前に登録されたものもここで保持する
+_min_interval = {}
+
+def _get(name, factory):
+    c = _clients.get(name)
+    if c is not None:
+        return c
+    with _lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+def set_client(name, client):
+    # テスト・ベンチマーク用の差し替え（"x_client" / "x_api_v1" / "genai"）
+    with _lock:
+        _clients[name] = client
+
+def set_min_interval(endpoint, sec):
+    """例: set_min_interval("POST /2/tweets", 5)。limiter が既にあればすぐ反映する"""
+    with _lock:
+        _min_interval[endpoint] = sec
+        limiter = _clients.get("limiter")
+        if limiter is not None:
+            limiter.min_interval[endpoint] = sec
+
+def get_limiter():
+    def make():
+        from rate_limiter import get_limiter as shared_limiter
+        limiter = shared_limiter()
+        limiter.min_interval.update(_min_interval)
+        return limiter
+    return _get("limiter", make)
+
+def get_x_client():
+    # tweepy.Client（v2）。検索系のため bearer token も渡す
+    def make():
+        from rate_limiter import RateLimitedClient
+        return RateLimitedClient(
+            bearer_token=os.getenv("X_BEARER_TOKEN"),
+            consumer_key=os.getenv("API_KEY"),
+            consumer_secret=os.getenv("API_SECRET"),
+            access_token=os.getenv("ACCESS_TOKEN"),
+            access_token_secret=os.getenv("ACCESS_TOKEN_SECRET"),
+            limiter=get_limiter(),
+        )
+    return _get("x_client", make)
+
+def get_x_api_v1():
+    # tweepy.API（v1.1：media_upload 用）
+    def make():
+        import tweepy
+        from rate_limiter import RateLimitedAPI
+        return RateLimitedAPI(
+            tweepy.OAuth1UserHandler(
+                os.getenv("API_KEY"),
+                os.getenv("API_SECRET"),
+                os.getenv("ACCESS_TOKEN"),
+                os.getenv("ACCESS_TOKEN_SECRET"),
+            ),
+            limiter=get_limiter(),
+        )
+    return _get("x_api_v1", make)
+
+def get_genai_client():
+    def make():
+        from google import genai
+        from gemini_hedge import GEMINI_DEADLINE_SEC
+        # 締め切りを過ぎて捨てたリクエストも、HTTP側のタイムアウトで必ず終わらせる
+        return genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options=genai.types.HttpOptions(timeout=int(GEMINI_DEADLINE_SEC * 1000)),
+        )
+    return _get("genai", make)
+
+def genai_types():
+    # google.genai.types（GenerateContentConfig 等）。初回だけ import する
+    from google.genai import types
+    return types
@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import threading
+import unicodedata
+
+import numpy as np
+
+# =========================
+# 基本設定
+# =========================
+# これ以上似ていたら「ほぼ同じ文」とみなす（推定 Jaccard）
+DUP_THRESHOLD = float(os.getenv("DUP_THRESHOLD", "0.5"))
+
+NUM_PERM = 64
+# LSH：32バンド×2行（推定 Jaccard 0.5 の組はほぼ確実に候補に入る。候補は署名で検証する）
+BANDS = 32
+NGRAM = 3
+
+# 比べるときに無視する記号・空白（表記ゆれで差が出ないように）
+IGNORE_RE = re.compile(r"[\s、。，．,.!！?？「」『』（）()【】・…〜~ー－-]+")
+
+# =========================
+# 文字 n-gram
+# =========================
+def shingles(text, n=NGRAM):
+    """NFKC で正規化し、記号・空白を除いた文字 n-gram のハッシュ（uint64 の集合）"""
+    t = IGNORE_RE.sub("", unicodedata.normalize("NFKC", text or ""))
+    cps = np.frombuffer(t.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(cps) == 0:
+        return cps
+    n = min(n, len(cps))
+    m = len(cps) - n + 1
+    h = np.full(m, 0xCBF29CE484222325, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(n):
+            h = (h ^ cps[k:k + m]) * np.uint64(0x100000001B3)
+    return np.unique(h)
+
+# =========================
+# MinHash + LSH の索引（ディスクに .npz で保存）
+# =========================
+class NearDupIndex:
+    """
+    投稿済みの文章を MinHash 署名（64 × uint32）だけで持ち、新しい文章と似ているものを探す。
+    scope（例: "auto_gen_x" / "pressure:body:仙台"）が同じものどうしだけを比べる。
+    """
+
+    def __init__(self, path, threshold=DUP_THRESHOLD, seed=1):
+        self.path = path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        rng = np.random.default_rng(seed)
+        # multiply-shift ハッシュ（a は奇数）
+        self.a = rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+
+        self.sigs = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self.scope_ids = np.empty(0, dtype=np.int32)
+        self.scopes = []
+        self.labels = []
+        self.buckets = {}
+        self._load()
+
+    # ---- 署名 ----
+    def signature(self, text):
+        sh = shingles(text)
+        if len(sh) == 0:
+            return np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            hv = (self.a[:, None] * sh[None, :] + self.b[:, None]) >> np.uint64(32)
+        return hv.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, sig):
+        r = NUM_PERM // BANDS
+        return [(i, sig[i * r:(i + 1) * r].tobytes()) for i in range(BANDS)]
+
+    def _scope_id(self, scope, create=False):
+        try:
+            return self.scopes.index(scope)
+        except ValueError:
+            if not create:
+                return None
+            self.scopes.append(scope)
+            return len(self.scopes) - 1
+
+    # ---- 検索 ----
+    def query(self, text, scope):
+        """同じ scope で最も似ている投稿の (推定 Jaccard, label)。無ければ (0.0, None)"""
+        sig = self.signature(text)
+        with self.lock:
+            sid = self._scope_id(scope)
+            if sid is None:
+                return 0.0, None
+            rows = set()
+            for k in self._band_keys(sig):
+                rows.update(self.buckets.get(k, ()))
+            rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            rows = rows[self.scope_ids[rows] == sid]
+            if len(rows) == 0:
+                return 0.0, None
+            sims = (self.sigs[rows] == sig).mean(axis=1)
+            best = int(np.argmax(sims))
+            return float(sims[best]), self.labels[rows[best]]
+
+    def similarity(self, a, b):
+        # 索引に入れていない2つの文の推定 Jaccard
+        return float((self.signature(a) == self.signature(b)).mean())
+
+    def is_duplicate(self, text, scope):
+        sim, _ = self.query(text, scope)
+        return sim >= self.threshold
+
+    def __len__(self):
+        return len(self.sigs)
+
+    def count(self, scope):
+        with self.lock:
+            sid = self._scope_id(scope)
+            return 0 if sid is None else int((self.scope_ids == sid).sum())
+
+    # ---- 追加 ----
+    def add(self, text, scope, label=None, save=True):
+        sig = self.signature(text)
+        with self.lock:
+            row = len(self.sigs)
+            self.sigs = np.vstack([self.sigs, sig[None, :]])
+            self.scope_ids = np.append(self.scope_ids, np.int32(self._scope_id(scope, create=True)))
+            self.labels.append(label)
+            for k in self._band_keys(sig):
+                self.buckets.setdefault(k, []).append(row)
+            if save:
+                self._save()
+
+    def add_many(self, items, scope):
+        # 初回の取り込み用：(text, label) をまとめて追加して1回だけ保存
+        for text, label in items:
+            if text:
+                self.add(text, scope, label, save=False)
+        with self.lock:
+            self._save()
+
+    # ---- 保存・読み込み ----
+    def _save(self):
+        d = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(d, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                sigs=self.sigs,
+                scope_ids=self.scope_ids,
+                scopes=np.array(json.dumps(self.scopes, ensure_ascii=False)),
+                labels=np.array(json.dumps(self.labels, ensure_ascii=False)),
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as z:
+                self.sigs = z["sigs"].astype(np.uint32)
+                self.scope_ids = z["scope_ids"].astype(np.int32)
+                self.scopes = json.loads(str(z["scopes"]))
+                self.labels = json.loads(str(z["labels"]))
+        except Exception as e:
+            print(f"dedup index load error ({self.path}): {e}")
+            return
+        for row, sig in enumerate(self.sigs):
+            for k in self._band_keys(sig):
+                self.buckets.setdefault(k, []).append(row)
@@ -0,0 +1,72 @@
+# =========================
+# 判定ロジック（pressure_forecast_bot と backtest で共有）
+# =========================
+# 朝6時を基準に、12時・18時・24時（翌0時）の値を見る
+BASE_HOUR = 6
+SAMPLE_HOURS = (12, 18, 24)
+
+# 気圧：1日の振れ幅 / 6→24時差（hPa）
+RANGE_HIGH = 8
+DELTA_HIGH = 7
+RANGE_MID = 5
+DELTA_MID = 4
+
+# 増幅要因：気温差（℃）/ 露点最大（℃）
+TEMP_RANGE_AMP = 7
+DEW_MAX_AMP = 16
+
+# 急な下降（hPa）：サンプル時刻の間に挟まって見落とす3時間・6時間の落ち込み
+DROP_3H_HIGH = 3
+DROP_6H_HIGH = 5
+DROP_3H_MID = 2
+
+PRESSURE_LABELS = ["穏やか", "やや変化", "変化大"]
+
+def _num(v):
+    # None・NaN は 0 扱い
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return 0.0
+    return v if v == v else 0.0
+
+def classify_pressure(base, h12, h18, h24, features=None):
+    """
+    features（pressure_features.extract の結果）を渡すと、
+    サンプル時刻の間の急な下降でもレベルを引き上げる（下げることはない）。
+    """
+    vals = [base, h12, h18, h24]
+    day_range = max(vals) - min(vals)
+    delta = h24 - base
+
+    if day_range >= RANGE_HIGH or abs(delta) >= DELTA_HIGH:
+        level = 2
+    elif day_range >= RANGE_MID or abs(delta) >= DELTA_MID:
+        level = 1
+    else:
+        level = 0
+
+    if features:
+        d3 = _num(features.get("max_drop_3h"))
+        d6 = _num(features.get("max_drop_6h"))
+        if d3 >= DROP_3H_HIGH or d6 >= DROP_6H_HIGH:
+            level = 2
+        elif d3 >= DROP_3H_MID:
+            level = max(level, 1)
+
+    return level, PRESSURE_LABELS[level], day_range, delta
+
+def classify_amplifier(temp_range, dew_max):
+    score = 0
+    if temp_range >= TEMP_RANGE_AMP:
+        score += 1
+    if dew_max >= DEW_MAX_AMP:
+        score += 1
+    return score
+
+def closing_style(total_level):
+    if total_level <= 1:
+        return "安心"
+    if total_level <= 3:
+        return "軽い注意"
+    return "注意喚起"
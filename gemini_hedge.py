@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from state_store import StateStore
+
+# =========================
+# 基本設定
+# =========================
+# 1回の生成にかける上限（秒）。超えたら TimeoutError
+GEMINI_DEADLINE_SEC = float(os.getenv("GEMINI_DEADLINE_SEC", "60"))
+# ヘッジ（同じリクエストの2本目）は1日の呼び出し数のこの割合まで
+GEMINI_HEDGE_BUDGET = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.1"))
+# ヘッジを出すまでの待ち時間の下限・実績が少ないうちの既定値（秒）
+GEMINI_HEDGE_MIN_SEC = float(os.getenv("GEMINI_HEDGE_MIN_SEC", "2"))
+GEMINI_HEDGE_DEFAULT_SEC = float(os.getenv("GEMINI_HEDGE_DEFAULT_SEC", "15"))
+# この件数の実績が貯まるまでは p90 を使わない
+GEMINI_HEDGE_MIN_SAMPLES = 20
+GEMINI_LATENCY_PATH = os.getenv("GEMINI_LATENCY_PATH", "gemini_latency.json")
+# 1日の区切り（ヘッジ予算）は JST
+TZ = ZoneInfo("Asia/Tokyo")
+
+# 所要時間ヒストグラムの境界（0.1秒〜約2分、25%刻み）
+EDGES = [round(0.1 * 1.25 ** i, 3) for i in range(33)]
+# 合計がこれを超えたら半分にして、古い実績の重みを下げる
+DECAY_AT = 2000
+
+store = StateStore(GEMINI_LATENCY_PATH, {"models": {}, "day": None, "calls": 0, "hedges": 0})
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini")
+
+# =========================
+# 実績（モデルごとの所要時間ヒストグラム）
+# =========================
+def _hist(st, model):
+    return st["models"].setdefault(model, [0] * (len(EDGES) + 1))
+
+def observe(model, sec):
+    with store.transaction() as st:
+        h = _hist(st, model)
+        i = next((k for k, e in enumerate(EDGES) if sec <= e), len(EDGES))
+        h[i] += 1
+        if sum(h) > DECAY_AT:
+            st["models"][model] = [c // 2 for c in h]
+
+def percentile(model, q):
+    """ヒストグラムから q 分位の所要時間（バケットの上端）。実績が少なければ None"""
+    with store.lock:
+        h = list(store.data["models"].get(model) or [])
+    total = sum(h)
+    if total < GEMINI_HEDGE_MIN_SAMPLES:
+        return None
+    acc = 0
+    for k, c in enumerate(h):
+        acc += c
+        if acc >= q * total:
+            return EDGES[k] if k < len(EDGES) else EDGES[-1] * 1.25
+    return EDGES[-1]
+
+def hedge_delay(model):
+    p90 = percentile(model, 0.9)
+    return max(GEMINI_HEDGE_MIN_SEC, p90 if p90 is not None else GEMINI_HEDGE_DEFAULT_SEC)
+
+def _count_call(hedge=False):
+    """
+    今日の呼び出し数・ヘッジ数を数える。hedge=True のときは予算内なら数えて True。
+    """
+    with store.transaction() as st:
+        today = datetime.now(TZ).date().isoformat()
+        if st.get("day") != today:
+            st["day"], st["calls"], st["hedges"] = today, 0, 0
+        if not hedge:
+            st["calls"] += 1
+            return True
+        if st["hedges"] + 1 > max(1.0, GEMINI_HEDGE_BUDGET * st["calls"]):
+            return False
+        st["hedges"] += 1
+        return True
+
+def _start_hedge(fn):
+    """
+    ヘッジは共有プールに積まず、専用スレッドで走らせる。
+    プールが詰まった呼び出しで埋まっていても、ヘッジがその後ろで待たされないように（数は予算で抑えられる）
+    """
+    f = Future()
+
+    def run():
+        if not f.set_running_or_notify_cancel():
+            return
+        try:
+            f.set_result(fn())
+        except BaseException as e:
+            f.set_exception(e)
+
+    threading.Thread(target=run, name="gemini-hedge", daemon=True).start()
+    return f
+
+# =========================
+# 生成（締め切り＋ヘッジ）
+# =========================
+def generate_content(client, model, **kwargs):
+    """
+    client.models.generate_content と同じ引数で呼ぶ。
+    1本目が p90 を超えても返らなければ、予算の範囲で同じリクエストをもう1本出し、
+    先に返った方を使う（残った方は結果を捨てる）。全体で GEMINI_DEADLINE_SEC を超えたら TimeoutError。
+    """
+    deadline = time.monotonic() + GEMINI_DEADLINE_SEC
+    _count_call()
+
+    def call():
+        t0 = time.monotonic()
+        r = client.models.generate_content(model=model, **kwargs)
+        observe(model, time.monotonic() - t0)
+        return r
+
+    delay = hedge_delay(model)
+    pending = {_executor.submit(call)}
+    # 締め切りまでに p90 に届かないならヘッジしない
+    hedged = delay >= GEMINI_DEADLINE_SEC
+    errors = []
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        timeout = remaining if hedged else min(delay, remaining)
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for f in done:
+            if f.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return f.result()
+            errors.append(f.exception())
+
+        if not hedged and not done:
+            # 1本目が p90 を超えた：予算があればもう1本（ヘッジは1回まで）
+            hedged = True
+            if _count_call(hedge=True):
+                print(f"Gemini hedge: {model} {delay:.1f}秒超え")
+                pending.add(_start_hedge(call))
+
+    if errors and not pending:
+        raise errors[-1]
+    for f in pending:
+        f.cancel()
+    # 締め切り超え：遅い実績として残し、次回以降のヘッジを早める
+    observe(model, GEMINI_DEADLINE_SEC)
+    raise TimeoutError(f"Gemini {model}: {GEMINI_DEADLINE_SEC:.0f}秒以内に応答なし")
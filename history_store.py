@@ -0,0 +1,151 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# =========================
+# 投稿履歴（SQLite・WALモード）
+# =========================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    day       TEXT NOT NULL,
+    posted_at TEXT NOT NULL,
+    mode      TEXT,
+    viewpoint TEXT,
+    text      TEXT,
+    tweet_ids TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_day ON posts (day);
+CREATE TABLE IF NOT EXISTS queue (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    mode       TEXT NOT NULL,
+    viewpoint  TEXT NOT NULL,
+    text       TEXT NOT NULL
+);
+"""
+
+class HistoryStore:
+    """
+    ローテーション状態（モード・視点）・1日1回ガード・投稿履歴を1つの DB に持つ。
+    読み取りはメモリ上の state から。投稿が成功したときに record_post で
+    状態の更新と履歴の追加を1トランザクションでまとめて確定する。
+    作り置きの投稿（queue）も同じ DB に持つ。
+    """
+
+    def __init__(self, path, defaults=None):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.state = dict(defaults or {})
+        self.state.update({k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM state")})
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.state.get(key, default)
+
+    def _put(self, conn, updates):
+        conn.executemany(
+            "INSERT INTO state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in updates.items()],
+        )
+
+    def update_state(self, **updates):
+        with self.transaction() as conn:
+            self._put(conn, updates)
+        self.state.update(updates)
+
+    def record_post(self, day, posted_at, mode, viewpoint, text, tweet_ids, updates, queue_id=None):
+        """
+        投稿1件の履歴追加と状態の更新（ローテーション・投稿日）を1回で確定する。
+        キューの文を投稿したときは、その行の削除も同じトランザクションで
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO posts (day, posted_at, mode, viewpoint, text, tweet_ids) VALUES (?, ?, ?, ?, ?, ?)",
+                (day, posted_at, mode, viewpoint, text, json.dumps(tweet_ids)),
+            )
+            if queue_id is not None:
+                conn.execute("DELETE FROM queue WHERE id = ?", (queue_id,))
+            self._put(conn, updates)
+        self.state.update(updates)
+
+    def recent_posts(self, limit=10):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT day, posted_at, mode, viewpoint, text, tweet_ids FROM posts ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        keys = ("day", "posted_at", "mode", "viewpoint", "text", "tweet_ids")
+        return [dict(zip(keys, r), tweet_ids=json.loads(r[5] or "[]")) for r in rows]
+
+    # ---- 作り置きの投稿（モード×視点ごと、古い順に使う） ----
+    def enqueue(self, created_at, mode, viewpoint, text):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO queue (created_at, mode, viewpoint, text) VALUES (?, ?, ?, ?)",
+                (created_at, mode, viewpoint, text),
+            )
+
+    def queued(self, mode, viewpoint):
+        """(id, text) のリスト（古い順）"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, text FROM queue WHERE mode = ? AND viewpoint = ? ORDER BY id",
+                (mode, viewpoint),
+            ).fetchall()
+
+    def queued_counts(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT mode, viewpoint, COUNT(*) FROM queue GROUP BY mode, viewpoint").fetchall()
+        return {(m, v): n for m, v, n in rows}
+
+    def drop_queued(self, queue_id=None, before=None):
+        # id 指定で1件、before 指定でそれより古い作り置きをまとめて捨てる
+        with self.transaction() as conn:
+            if queue_id is not None:
+                conn.execute("DELETE FROM queue WHERE id = ?", (queue_id,))
+            if before is not None:
+                conn.execute("DELETE FROM queue WHERE created_at < ?", (before,))
+
+    def import_json(self, *paths):
+        """
+        旧形式の JSON（post_history.json・daily_post_state.json）の値を取り込む。
+        DB にまだ状態が無いときだけ（初回移行用）。
+        """
+        with self.lock:
+            if self.conn.execute("SELECT COUNT(*) FROM state").fetchone()[0]:
+                return False
+            updates = {}
+            for path in paths:
+                if not os.path.exists(path):
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        updates.update(json.load(f))
+                except Exception as e:
+                    print(f"history import error ({path}): {e}")
+            if not updates:
+                return False
+            self.update_state(**updates)
+            return True
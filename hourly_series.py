@@ -0,0 +1,124 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+HOUR_SEC = 3600
+
+# =========================
+# 1時間刻みの時系列（列ごとに型付き配列で保持）
+# =========================
+class HourlySeries:
+    """
+    fetch_weather の配列から一度だけ作る時系列。
+    時刻は先頭からの時間オフセットで引くので、検索のたびに
+    ISO文字列を解析したり dict を作り直したりしない。
+    欠損（気圧か気温が None）の行は NaN のまま持ち、検索時に飛ばす。
+    """
+
+    def __init__(self, start_epoch, pressure, temp, dew, tz, epochs=None):
+        self.start_epoch = start_epoch
+        self.pressure = pressure
+        self.temp = temp
+        self.dew = dew
+        self.tz = tz
+        # 等間隔でないときだけ時刻列を持ち、bisect で引く
+        self.epochs = epochs
+        self.valid = [not (math.isnan(p) or math.isnan(t)) for p, t in zip(pressure, temp)]
+
+    @classmethod
+    def from_arrays(cls, times, pressures, temps, dews, tz):
+        n = len(times)
+        pressure = array("d", (float(p) if p is not None else math.nan for p in pressures))
+        temp = array("d", (float(t) if t is not None else math.nan for t in temps))
+        dew = array("d", (float(d) if d else 0.0 for d in dews))
+        if n == 0:
+            return cls(0, pressure, temp, dew, tz)
+
+        first = datetime.fromisoformat(times[0]).replace(tzinfo=tz).timestamp()
+        last = datetime.fromisoformat(times[-1]).replace(tzinfo=tz).timestamp()
+        if last - first == (n - 1) * HOUR_SEC:
+            return cls(int(first), pressure, temp, dew, tz)
+
+        # 夏時間・欠け等で等間隔でない場合の保険
+        epochs = array("q", (int(datetime.fromisoformat(t).replace(tzinfo=tz).timestamp()) for t in times))
+        return cls(int(first), pressure, temp, dew, tz, epochs=epochs)
+
+    def __len__(self):
+        return len(self.pressure)
+
+    def is_empty(self):
+        return not any(self.valid)
+
+    def epoch_at(self, i):
+        if self.epochs is not None:
+            return self.epochs[i]
+        return self.start_epoch + i * HOUR_SEC
+
+    def time_at(self, i):
+        return datetime.fromtimestamp(self.epoch_at(i), self.tz)
+
+    def _raw_index(self, ts):
+        n = len(self)
+        if self.epochs is None:
+            i = int(round((ts - self.start_epoch) / HOUR_SEC))
+            return min(max(i, 0), n - 1)
+        j = bisect_left(self.epochs, ts)
+        if j <= 0:
+            return 0
+        if j >= n:
+            return n - 1
+        # 同じ距離なら前の時刻を優先
+        return j - 1 if ts - self.epochs[j - 1] <= self.epochs[j] - ts else j
+
+    def nearest_index(self, dt):
+        """dt に最も近い有効な行の添字（同距離なら前側）。有効行が無ければ None"""
+        n = len(self)
+        if n == 0:
+            return None
+        ts = dt.timestamp()
+        # j より前は ts 以前、j 以降は ts より後。最も近い有効行は
+        # 「ts 以前で最後の有効行」か「ts より後で最初の有効行」のどちらか（時刻で比べる）
+        if self.epochs is None:
+            j = min(max(math.floor((ts - self.start_epoch) / HOUR_SEC) + 1, 0), n)
+        else:
+            j = bisect_right(self.epochs, ts)
+        lo = j - 1
+        while lo >= 0 and not self.valid[lo]:
+            lo -= 1
+        hi = j
+        while hi < n and not self.valid[hi]:
+            hi += 1
+        if lo < 0:
+            return hi if hi < n else None
+        if hi >= n:
+            return lo
+        return lo if ts - self.epoch_at(lo) <= self.epoch_at(hi) - ts else hi
+
+    def at(self, dt):
+        i = self.nearest_index(dt)
+        if i is None:
+            raise KeyError("no valid hourly data")
+        return {
+            "pressure": self.pressure[i],
+            "temp": self.temp[i],
+            "dew": self.dew[i],
+        }
+
+    def at_hour(self, day, hour):
+        """day の hour 時（24 は翌日0時）に最も近い行"""
+        return self.at(self._day_hour(day, hour))
+
+    def _day_hour(self, day, hour):
+        return datetime(day.year, day.month, day.day, tzinfo=self.tz) + timedelta(hours=hour)
+
+    def window(self, day, start_hour, end_hour):
+        """
+        day の start_hour〜end_hour 時（両端含む）の気圧列と、その先頭の添字。
+        欠損は NaN のまま返す（特徴量側で扱う）。
+        """
+        if len(self) == 0:
+            return 0, array("d")
+        i0 = self._raw_index(self._day_hour(day, start_hour).timestamp())
+        i1 = self._raw_index(self._day_hour(day, end_hour).timestamp())
+        return i0, self.pressure[i0:i1 + 1]
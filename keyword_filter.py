@@ -0,0 +1,98 @@
+import os
+import unicodedata
+from collections import deque
+
+# =========================
+# 基本設定
+# =========================
+# any: 地名・悩みのどちらかに当たれば Gemini へ / both: 両方に当たったときだけ
+PREFILTER_MODE = os.getenv("PREFILTER_MODE", "any")
+
+# 仙台の区・地名（表記ゆれは normalize で吸収するので、ここは代表の書き方でよい）
+PLACE_WORDS = [
+    "仙台", "せんだい", "sendai", "杜の都",
+    "太白区", "若林区", "宮城野区", "青葉区", "泉区",
+    "長町", "泉中央", "八木山", "榴岡", "卸町", "荒井", "愛子", "北仙台", "宮城",
+]
+# 悩み（体の不調）の語
+SYMPTOM_WORDS = [
+    "自律神経", "肩こり", "肩凝り", "首こり", "頭痛", "偏頭痛", "片頭痛", "気圧",
+    "疲れ", "疲労", "だるい", "不眠", "眠れない", "めまい", "腰痛", "不調",
+    "眼精疲労", "冷え", "更年期", "ストレス", "パニック", "整体", "ゆらぎ",
+    # かな書き（カタカナ・半角カナも normalize でひらがなにそろう）
+    "じりつしんけい", "かたこり", "ずつう", "つかれ",
+]
+
+# =========================
+# 正規化（全角/半角・大文字/小文字・カタカナ/ひらがな をそろえる）
+# =========================
+_KATA_TO_HIRA = {c: c - 0x60 for c in range(ord("ァ"), ord("ヶ") + 1)}
+
+def normalize(text):
+    return unicodedata.normalize("NFKC", text or "").lower().translate(_KATA_TO_HIRA)
+
+# =========================
+# Aho-Corasick（全語を1回の走査で探す）
+# =========================
+class KeywordMatcher:
+    """words: {語: グループ名}。find() は当たったグループ名ごとの語の集合を返す"""
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for word, group in words.items():
+            w = normalize(word)
+            if not w:
+                continue
+            s = 0
+            for ch in w:
+                nxt = self.goto[s].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[s][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                s = nxt
+            self.out[s].append((group, w))
+
+        # 失敗リンクは幅優先で張る（短い接尾辞の出力も引き継ぐ）
+        q = deque(self.goto[0].values())
+        while q:
+            s = q.popleft()
+            for ch, nxt in self.goto[s].items():
+                q.append(nxt)
+                f = self.fail[s]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        hits = {}
+        s = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for ch in normalize(text):
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            for group, w in out[s]:
+                hits.setdefault(group, set()).add(w)
+        return hits
+
+_matcher = KeywordMatcher({**{w: "place" for w in PLACE_WORDS}, **{w: "symptom" for w in SYMPTOM_WORDS}})
+
+def score(description):
+    """(地名に当たった数, 悩みの語に当たった数)"""
+    hits = _matcher.find(description)
+    return len(hits.get("place", ())), len(hits.get("symptom", ()))
+
+def is_candidate(description):
+    """Gemini に聞く価値があるか（明らかに対象外のプロフィールはここで落とす）"""
+    if not (description or "").strip():
+        return False
+    place, symptom = score(description)
+    if PREFILTER_MODE == "both":
+        return place > 0 and symptom > 0
+    return place + symptom > 0
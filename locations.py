@@ -0,0 +1,43 @@
+import os
+
+# =========================
+# 地点レジストリ（仙台市の各区＋近隣市）
+# =========================
+# key: 状態ファイル等で使う識別子 / label: 投稿の見出しに出す名前
+LOCATIONS = [
+    {"key": "仙台", "label": "仙台", "lat": 38.2682, "lon": 140.8694},
+    {"key": "青葉区", "label": "仙台・青葉区", "lat": 38.2652, "lon": 140.8664},
+    {"key": "宮城野区", "label": "仙台・宮城野区", "lat": 38.2617, "lon": 140.8950},
+    {"key": "若林区", "label": "仙台・若林区", "lat": 38.2455, "lon": 140.8914},
+    {"key": "太白区", "label": "仙台・太白区", "lat": 38.2237, "lon": 140.8777},
+    {"key": "泉区", "label": "仙台・泉区", "lat": 38.3236, "lon": 140.8818},
+    {"key": "名取市", "label": "名取", "lat": 38.1716, "lon": 140.8918},
+    {"key": "多賀城市", "label": "多賀城", "lat": 38.2938, "lon": 141.0043},
+    {"key": "塩竈市", "label": "塩竈", "lat": 38.3143, "lon": 141.0220},
+    {"key": "富谷市", "label": "富谷", "lat": 38.3999, "lon": 140.8953},
+    {"key": "岩沼市", "label": "岩沼", "lat": 38.1043, "lon": 140.8700},
+]
+
+LOCATION_BY_KEY = {loc["key"]: loc for loc in LOCATIONS}
+
+DEFAULT_LOCATION = "仙台"
+
+def active_locations():
+    """
+    PRESSURE_LOCATIONS（カンマ区切りのkey）で投稿対象を選ぶ。
+    未設定なら従来どおり仙台1地点。"all" で全地点。
+    """
+    raw = os.getenv("PRESSURE_LOCATIONS", DEFAULT_LOCATION).strip()
+    if raw.lower() == "all":
+        return list(LOCATIONS)
+
+    out = []
+    for k in raw.split(","):
+        k = k.strip()
+        if not k:
+            continue
+        if k not in LOCATION_BY_KEY:
+            print("unknown location:", k)
+            continue
+        out.append(LOCATION_BY_KEY[k])
+    return out or [LOCATION_BY_KEY[DEFAULT_LOCATION]]
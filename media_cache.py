@@ -0,0 +1,131 @@
+import os
+import time
+import hashlib
+import threading
+
+from state_store import StateStore
+
+# =========================
+# 基本設定
+# =========================
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", "media_cache.json")
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+
+# 失効のこの秒数前になったら裏で上げ直す（投稿の直前に失効しないように）
+MEDIA_REFRESH_MARGIN_SEC = int(os.getenv("MEDIA_REFRESH_MARGIN_SEC", "3600"))
+# APIが失効時刻を返さなかったときの想定（X の画像は24時間）
+MEDIA_DEFAULT_TTL_SEC = 24 * 3600
+
+# 事前に縮小・再圧縮したコピーの設定
+OPTIMIZE_MAX_SIDE = int(os.getenv("MEDIA_OPTIMIZE_MAX_SIDE", "1600"))
+OPTIMIZE_JPEG_QUALITY = int(os.getenv("MEDIA_OPTIMIZE_JPEG_QUALITY", "85"))
+
+store = StateStore(MEDIA_CACHE_PATH, {"media": {}})
+
+_upload_lock = threading.Lock()
+_timers = {}
+
+# =========================
+# 補助
+# =========================
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def optimized_path(path, digest):
+    """
+    縮小・再圧縮したコピーを作っておき、そのパスを返す。
+    元より小さくならない／Pillow が無いときは元のパスをそのまま使う。
+    """
+    out = os.path.join(MEDIA_CACHE_DIR, f"{digest[:16]}.jpg")
+    if os.path.exists(out):
+        return out
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return path
+
+    try:
+        os.makedirs(MEDIA_CACHE_DIR, exist_ok=True)
+        with Image.open(path) as im:
+            im = im.convert("RGB")
+            im.thumbnail((OPTIMIZE_MAX_SIDE, OPTIMIZE_MAX_SIDE))
+            tmp = out + ".tmp"
+            im.save(tmp, "JPEG", quality=OPTIMIZE_JPEG_QUALITY, optimize=True, progressive=True)
+        if os.path.getsize(tmp) >= os.path.getsize(path):
+            os.remove(tmp)
+            return path
+        os.replace(tmp, out)
+        return out
+    except Exception as e:
+        print("media optimize error:", repr(e))
+        return path
+
+def _valid_entry(digest):
+    with store.lock:
+        entry = store.data["media"].get(digest)
+    if not entry:
+        return None
+    if time.time() >= entry["expires_at"] - MEDIA_REFRESH_MARGIN_SEC:
+        return None
+    return entry
+
+# =========================
+# アップロード（内容ハッシュごとに media_id を使い回す）
+# =========================
+def _upload(path, digest, upload):
+    media = upload(optimized_path(path, digest))
+    media_id = getattr(media, "media_id_string", None) or str(media.media_id)
+    ttl = getattr(media, "expires_after_secs", None) or MEDIA_DEFAULT_TTL_SEC
+    entry = {
+        "media_id": media_id,
+        "uploaded_at": time.time(),
+        "expires_at": time.time() + int(ttl),
+    }
+    with store.transaction() as st:
+        # 失効済みのものは掃除しておく
+        st["media"] = {k: v for k, v in st["media"].items() if v["expires_at"] > time.time()}
+        st["media"][digest] = entry
+    return entry
+
+def get_media_id(path, upload, refresh=True):
+    """
+    upload(path) は tweepy.API.media_upload 相当。
+    有効な media_id があればアップロードせずに返す。refresh=True なら失効前の上げ直しも予約する。
+    """
+    digest = file_hash(path)
+    entry = _valid_entry(digest)
+    if not entry:
+        with _upload_lock:
+            # 待っている間に別スレッドが上げ終えていればそれを使う
+            entry = _valid_entry(digest) or _upload(path, digest, upload)
+    if refresh:
+        schedule_refresh(path, digest, entry, upload)
+    return entry["media_id"]
+
+def schedule_refresh(path, digest, entry, upload):
+    delay = entry["expires_at"] - MEDIA_REFRESH_MARGIN_SEC - time.time()
+    with _upload_lock:
+        t = _timers.get(digest)
+        if t and t.is_alive():
+            return
+        t = threading.Timer(max(delay, 0) + 1, _refresh, args=(path, digest, upload))
+        t.daemon = True
+        _timers[digest] = t
+        t.start()
+
+def _refresh(path, digest, upload):
+    try:
+        if file_hash(path) != digest:
+            return
+        with _upload_lock:
+            _timers.pop(digest, None)
+            entry = _upload(path, digest, upload)
+        print("media refreshed:", entry["media_id"])
+        schedule_refresh(path, digest, entry, upload)
+    except Exception as e:
+        print("media refresh error:", repr(e))
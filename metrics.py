@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =========================
+# 基本設定
+# =========================
+# 公開するポート（Railway の web プロセスには PORT が渡される）。未設定なら公開しない
+METRICS_PORT = os.getenv("METRICS_PORT") or os.getenv("PORT")
+
+# 所要時間ヒストグラムの境界（秒）。Gemini の数十秒まで拾えるようにする
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+# (stage, ((label, value), ...)) → 集計
+_stats = {}
+# (event, ((label, value), ...)) → 回数（キャッシュのヒット・ミスなど、時間を測らないもの）
+_counts = {}
+
+# =========================
+# 記録
+# =========================
+def observe(stage, sec, ok=True, **labels):
+    key = (stage, tuple(sorted(labels.items())))
+    with _lock:
+        s = _stats.get(key)
+        if s is None:
+            s = _stats[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0, "errors": 0}
+        for i, b in enumerate(BUCKETS):
+            if sec <= b:
+                s["buckets"][i] += 1
+        s["sum"] += sec
+        s["count"] += 1
+        if not ok:
+            s["errors"] += 1
+
+@contextmanager
+def timer(stage, **labels):
+    """with 内の所要時間を記録する。例外が出たらエラーとして数え、そのまま投げ直す"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        observe(stage, time.perf_counter() - t0, False, **labels)
+        raise
+    observe(stage, time.perf_counter() - t0, True, **labels)
+
+def inc(event, n=1, **labels):
+    key = (event, tuple(sorted(labels.items())))
+    with _lock:
+        _counts[key] = _counts.get(key, 0) + n
+
+def timed(stage):
+    # 関数全体を計測するデコレータ
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+# =========================
+# Prometheus テキスト形式
+# =========================
+def _esc(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(stage, labels, extra=(), name="stage"):
+    items = ((name, stage),) + labels + extra
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in items) + "}"
+
+def render():
+    with _lock:
+        snapshot = {k: {**v, "buckets": list(v["buckets"])} for k, v in _stats.items()}
+        counts = dict(_counts)
+
+    lines = [
+        "# HELP bot_stage_duration_seconds Latency of bot stages and external API calls.",
+        "# TYPE bot_stage_duration_seconds histogram",
+    ]
+    for (stage, labels), s in sorted(snapshot.items()):
+        for b, n in zip(BUCKETS, s["buckets"]):
+            lines.append(f"bot_stage_duration_seconds_bucket{_labels(stage, labels, (('le', repr(b)),))} {n}")
+        lines.append(f"bot_stage_duration_seconds_bucket{_labels(stage, labels, (('le', '+Inf'),))} {s['count']}")
+        lines.append(f"bot_stage_duration_seconds_sum{_labels(stage, labels)} {s['sum']:.6f}")
+        lines.append(f"bot_stage_duration_seconds_count{_labels(stage, labels)} {s['count']}")
+
+    lines += [
+        "# HELP bot_stage_calls_total Number of calls per stage.",
+        "# TYPE bot_stage_calls_total counter",
+    ]
+    lines += [f"bot_stage_calls_total{_labels(stage, labels)} {s['count']}" for (stage, labels), s in sorted(snapshot.items())]
+
+    lines += [
+        "# HELP bot_stage_errors_total Number of calls per stage that raised.",
+        "# TYPE bot_stage_errors_total counter",
+    ]
+    lines += [f"bot_stage_errors_total{_labels(stage, labels)} {s['errors']}" for (stage, labels), s in sorted(snapshot.items())]
+
+    lines += [
+        "# HELP bot_events_total Number of counted events (cache hits and misses etc.).",
+        "# TYPE bot_events_total counter",
+    ]
+    lines += [f"bot_events_total{_labels(event, labels, name='event')} {n}" for (event, labels), n in sorted(counts.items())]
+    return "\n".join(lines) + "\n"
+
+# =========================
+# HTTP エンドポイント（/metrics）
+# =========================
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+_server = None
+
+def start_server(port=METRICS_PORT, host="0.0.0.0"):
+    """
+    /metrics を別スレッドで公開する。ポート未設定なら何もしない。
+    同じプロセスで何度呼んでも1回だけ起動する。
+    """
+    global _server
+    if port in (None, ""):
+        return None
+    with _lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, int(port)), _Handler)
+        except OSError as e:
+            print(f"metrics server error: {e}")
+            return None
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    print(f"metrics: http://{host}:{port}/metrics")
+    return _server
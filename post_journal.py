@@ -0,0 +1,87 @@
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from state_store import StateStore
+
+# 記録の日付は JST（ホストのタイムゾーンに依らない）
+TZ = ZoneInfo("Asia/Tokyo")
+
+# =========================
+# 投稿ジャーナル（スレッドの途中失敗から再開する）
+# =========================
+class PostJournal:
+    """
+    スレッドの計画（各ツイートの本文）と、投稿できたツイートIDを順番に記録する。
+    途中で失敗しても、次回は記録済みの続きから同じ本文で投稿する
+    （取得・生成をやり直さず、1ツイート目を二重に出さない）。
+
+    計画が全部決まる前に1ツイート目だけ出す場合は sealed=False で始め、
+    残りが決まったら extend() で足して確定する。
+    """
+
+    def __init__(self, path, keep_days=2):
+        self.store = StateStore(path, {"threads": {}})
+        self.keep_days = keep_days
+
+    @staticmethod
+    def thread_key(name, day):
+        return f"{name}:{day.isoformat()}"
+
+    def get(self, tkey):
+        with self.store.lock:
+            entry = self.store.data["threads"].get(tkey)
+            return None if entry is None else {**entry, "parts": list(entry["parts"]), "ids": list(entry["ids"])}
+
+    def begin(self, tkey, parts, meta=None, sealed=True):
+        """tkey の計画を作る。既にあれば（再開時）それをそのまま使う"""
+        with self.store.transaction() as st:
+            threads = st["threads"]
+            # 古い記録は捨てる
+            today = datetime.now(TZ).date()
+            cutoff = (today - timedelta(days=self.keep_days)).isoformat()
+            for k in [k for k, v in threads.items() if v.get("day", "") < cutoff]:
+                del threads[k]
+
+            if tkey not in threads:
+                threads[tkey] = {
+                    "day": today.isoformat(),
+                    "created_at": time.time(),
+                    "parts": list(parts),
+                    "ids": [],
+                    "meta": dict(meta or {}),
+                    "sealed": sealed,
+                }
+        return self.get(tkey)
+
+    def extend(self, tkey, parts, meta=None):
+        # 残りの計画を足して確定する（確定済みなら何もしない）
+        with self.store.transaction() as st:
+            entry = st["threads"][tkey]
+            if entry["sealed"]:
+                return
+            entry["parts"].extend(parts)
+            entry["meta"].update(meta or {})
+            entry["sealed"] = True
+
+    def post(self, tkey, create):
+        """
+        未投稿の分を順に create(part, parent_id) で投稿する（戻り値は新しいツイートID）。
+        戻り値は (計画どおり全部出せたか, 最後のツイートID)。
+        """
+        entry = self.get(tkey)
+        parent_id = entry["ids"][-1] if entry["ids"] else None
+        for i in range(len(entry["ids"]), len(entry["parts"])):
+            part = entry["parts"][i]
+            try:
+                parent_id = str(create(part, parent_id))
+            except Exception as e:
+                print(f"{part.get('label', 'post')} error ({tkey} {i + 1}/{len(entry['parts'])}):", repr(e))
+                return False, parent_id
+            with self.store.transaction() as st:
+                st["threads"][tkey]["ids"].append(parent_id)
+        return entry["sealed"], parent_id
+
+    def finish(self, tkey):
+        with self.store.transaction() as st:
+            st["threads"].pop(tkey, None)
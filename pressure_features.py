@@ -0,0 +1,73 @@
+import numpy as np
+
+import forecast_rules as rules
+
+# =========================
+# 1時間刻みの気圧から特徴量をまとめて作る
+# =========================
+def extract(pressure):
+    """
+    pressure: (時間,) または (地点・日数, 時間) の配列（欠損は NaN）
+    戻り値の各値は入力の先頭の次元と同じ形（1次元入力ならスカラー相当の0次元配列）。
+
+    max_drop_3h / max_drop_6h : 3時間・6時間で最も下がった量（hPa、下降を正）
+    max_rise_3h               : 3時間で最も上がった量（hPa）
+    slope                     : 全体の回帰直線の傾き（hPa/時）
+    steepest_idx              : 3時間変化（上がり・下がりとも）が最も急だった区間の終わりの添字（-1 は不明）
+    steepest_drop_idx         : 3時間で最も下がった区間の終わりの添字（下がった区間が無ければ -1）
+    """
+    p = np.asarray(pressure, dtype=np.float64)
+    if p.ndim == 1:
+        feats = extract(p[None, :])
+        return {k: v[0] for k, v in feats.items()}
+
+    n = p.shape[1]
+    out = {}
+
+    with np.errstate(invalid="ignore"):
+        d3 = p[:, 3:] - p[:, :-3] if n > 3 else np.full((p.shape[0], 1), np.nan)
+        d6 = p[:, 6:] - p[:, :-6] if n > 6 else np.full((p.shape[0], 1), np.nan)
+
+        out["max_drop_3h"] = _nanmax(-d3)
+        out["max_drop_6h"] = _nanmax(-d6)
+        out["max_rise_3h"] = _nanmax(d3)
+
+        # 欠損を除いた最小二乗の傾き
+        t = np.arange(n, dtype=np.float64)[None, :]
+        valid = ~np.isnan(p)
+        cnt = valid.sum(axis=1)
+        tv = np.where(valid, t, 0.0)
+        pv = np.where(valid, p, 0.0)
+        t_mean = tv.sum(axis=1) / np.maximum(cnt, 1)
+        p_mean = pv.sum(axis=1) / np.maximum(cnt, 1)
+        tc = np.where(valid, t - t_mean[:, None], 0.0)
+        pc = np.where(valid, p - p_mean[:, None], 0.0)
+        denom = (tc * tc).sum(axis=1)
+        out["slope"] = np.where(denom > 0, (tc * pc).sum(axis=1) / np.where(denom > 0, denom, 1), np.nan)
+
+    absd3 = np.abs(d3)
+    has = ~np.isnan(absd3).all(axis=1)
+    steep = np.argmax(np.where(np.isnan(absd3), -np.inf, absd3), axis=1) + 3
+    out["steepest_idx"] = np.where(has, steep, -1)
+
+    # 「急な下がり」の時刻はこちら（|Δ| の最大は上がりを指すことがある）
+    drop = np.where(np.isnan(d3), -np.inf, -d3)
+    has_drop = (drop > 0).any(axis=1)
+    out["steepest_drop_idx"] = np.where(has_drop, np.argmax(drop, axis=1) + 3, -1)
+    return out
+
+def _nanmax(a):
+    # 全部 NaN の行は NaN（警告を出さない nanmax）
+    has = ~np.isnan(a).all(axis=1)
+    filled = np.where(np.isnan(a), -np.inf, a)
+    return np.where(has, filled.max(axis=1), np.nan)
+
+def feature_level(feats):
+    """
+    急な下降だけで決まる気圧レベル（0〜2）。classify_pressure と同じ閾値を配列でまとめて判定する。
+    """
+    d3 = np.nan_to_num(np.asarray(feats["max_drop_3h"], dtype=np.float64), nan=0.0)
+    d6 = np.nan_to_num(np.asarray(feats["max_drop_6h"], dtype=np.float64), nan=0.0)
+    high = (d3 >= rules.DROP_3H_HIGH) | (d6 >= rules.DROP_6H_HIGH)
+    mid = d3 >= rules.DROP_3H_MID
+    return np.where(high, 2, np.where(mid, 1, 0))
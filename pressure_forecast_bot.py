@@ -1,14 +1,24 @@
 import os
-import time
-import json
 import re
+import math
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, time as dtime
 from zoneinfo import ZoneInfo
 
-import requests
-import tweepy
-from google import genai
-from google.genai import types
+import clients
+import gemini_hedge
+import weather_cache
+import media_cache
+import metrics
+import segmenter
+from hourly_series import HourlySeries
+# 判定ロジック（閾値）は backtest と共有
+from forecast_rules import DROP_3H_MID, classify_pressure, classify_amplifier, closing_style
+from locations import DEFAULT_LOCATION, active_locations
+from state_store import StateStore
+from post_journal import PostJournal
+from scheduler import DailyScheduler
 
 # =========================
 # 基本設定
@@ -16,17 +26,35 @@ from google.genai import types
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TZ = ZoneInfo("Asia/Tokyo")
 
-SENDAI_LAT = 38.2682
-SENDAI_LON = 140.8694
+# 同時に投稿処理する地点数の上限
+PRESSURE_MAX_WORKERS = int(os.getenv("PRESSURE_MAX_WORKERS", "4"))
 
 POST_HOUR = int(os.getenv("POST_HOUR", "6"))
-TWEET_LIMIT = 135
-REPLY_WAIT_SEC = float(os.getenv("REPLY_WAIT_SEC", "2.5"))
+TWEET_LIMIT = 135  # 全角換算（X の重み付きでは270）
+# リプライ間の最短間隔（実際の間隔はレート制限ヘッダから rate_limiter が決める）
+REPLY_WAIT_SEC = float(os.getenv("REPLY_WAIT_SEC", "0"))
+# 投稿に失敗した地点が残っているときの再実行間隔
+RETRY_SEC = int(os.getenv("PRESSURE_RETRY_SEC", "60"))
+# concurrent: Gemini生成と画像アップロードを並行 / serial: 従来どおり順番に
+PIPELINE_MODE = os.getenv("PRESSURE_PIPELINE", "concurrent")
+# POST_HOUR の何分前に「準備」（取得・生成・画像アップロード）を済ませておくか
+PREPARE_LEAD_MIN = int(os.getenv("PRESSURE_PREPARE_LEAD_MIN", "30"))
+# 準備済みの投稿がこれより古ければ、投稿時に作り直す
+STAGED_MAX_AGE_MIN = int(os.getenv("PRESSURE_STAGED_MAX_AGE_MIN", "120"))
 
 STATE_PATH = os.getenv("PRESSURE_STATE_PATH", "pressure_state.json")
+JOURNAL_PATH = os.getenv("PRESSURE_JOURNAL_PATH", "pressure_journal.json")
+# 投稿済み本文の MinHash 索引（過去とほぼ同じ文の検出）
+DEDUP_PATH = os.getenv("PRESSURE_DEDUP_PATH", "pressure_dedup.npz")
+# 過去とほぼ同じ文が出たときに作り直す回数
+DUP_RETRY = int(os.getenv("PRESSURE_DUP_RETRY", "1"))
 BANNER_NAME = os.getenv("PRESSURE_BANNER_PATH", "pressurex.jpg")
 BANNER_PATH = os.path.join(BASE_DIR, BANNER_NAME)
 
+# 1 なら毎時の気圧の急な下降（pressure_features）でもレベルを引き上げる。
+# 既定は backtest.evaluate（use_features=False）と同じ判定。入れる前に backtest.py run <dir> --features で確かめる
+PRESSURE_FEATURES = (os.getenv("PRESSURE_FEATURES", "0") == "1")
+
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 GEMINI_TEMP = float(os.getenv("GEMINI_TEMP", "0.6"))
 
@@ -34,26 +62,9 @@ DEPLOY_RUN = (os.getenv("DEPLOY_RUN", "0") == "1")
 FORCE_POST = (os.getenv("FORCE_POST", "0") == "1")
 
 # =========================
-# Xクライアント
+# クライアント（初回使用時に clients が生成・共有する）
 # =========================
-x_client = tweepy.Client(
-    bearer_token=os.getenv("X_BEARER_TOKEN"),
-    consumer_key=os.getenv("API_KEY"),
-    consumer_secret=os.getenv("API_SECRET"),
-    access_token=os.getenv("ACCESS_TOKEN"),
-    access_token_secret=os.getenv("ACCESS_TOKEN_SECRET")
-)
-
-x_api_v1 = tweepy.API(
-    tweepy.OAuth1UserHandler(
-        os.getenv("API_KEY"),
-        os.getenv("API_SECRET"),
-        os.getenv("ACCESS_TOKEN"),
-        os.getenv("ACCESS_TOKEN_SECRET"),
-    )
-)
-
-gen_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+clients.set_min_interval("POST /2/tweets", REPLY_WAIT_SEC)
 
 # =========================
 # 状態管理
@@ -61,22 +72,26 @@ gen_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 def now_jst():
     return datetime.now(TZ)
 
-def load_state():
-    if not os.path.exists(STATE_PATH):
-        return {"last_post_date": None, "last_body": "", "last_extra": ""}
-    try:
-        with open(STATE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"last_post_date": None, "last_body": "", "last_extra": ""}
-
-def save_state(state):
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+# 起動時に1回だけ読み込み、以降の読み取りはメモリから
+state = StateStore(STATE_PATH, {"last_post_date": None, "last_body": "", "last_extra": ""})
+
+def _loc_state(st, key):
+    # 地点ごとの状態。仙台（従来の1地点）は旧形式のトップレベル値を引き継ぐ
+    locs = st.setdefault("locations", {})
+    if key not in locs:
+        if key == DEFAULT_LOCATION:
+            locs[key] = {
+                "last_post_date": st.get("last_post_date"),
+                "last_body": st.get("last_body", ""),
+                "last_extra": st.get("last_extra", ""),
+            }
+        else:
+            locs[key] = {"last_post_date": None, "last_body": "", "last_extra": ""}
+    return locs[key]
 
-def get_last_post_date():
-    st = load_state()
-    v = st.get("last_post_date")
+def get_last_post_date(key=DEFAULT_LOCATION):
+    with state.lock:
+        v = _loc_state(state.data, key).get("last_post_date")
     if not v:
         return None
     try:
@@ -84,135 +99,155 @@ def get_last_post_date():
     except Exception:
         return None
 
-def set_last_post_date(d):
-    st = load_state()
-    st["last_post_date"] = datetime.combine(d, dtime(0, 0), TZ).isoformat()
-    save_state(st)
+def mark_posted(d, body, extra, key=DEFAULT_LOCATION):
+    # 投稿日と本文を1回のアトミック書き込みでまとめて確定（準備済みの投稿も片付ける）
+    with state.transaction() as st:
+        ls = _loc_state(st, key)
+        ls["last_post_date"] = datetime.combine(d, dtime(0, 0), TZ).isoformat()
+        ls["last_body"] = body
+        ls["last_extra"] = extra
+        ls.pop("staged", None)
+
+def save_staged(staged, key=DEFAULT_LOCATION):
+    with state.transaction() as st:
+        _loc_state(st, key)["staged"] = staged
+
+def get_staged(today, key=DEFAULT_LOCATION):
+    """今日の分で、まだ新しい準備済み投稿があれば返す"""
+    with state.lock:
+        staged = _loc_state(state.data, key).get("staged")
+    if not staged or staged.get("date") != today.isoformat():
+        return None
+    try:
+        age = now_jst() - datetime.fromisoformat(staged["prepared_at"])
+    except Exception:
+        return None
+    if age > timedelta(minutes=STAGED_MAX_AGE_MIN):
+        return None
+    return staged
 
-def get_last_texts():
-    st = load_state()
-    return st.get("last_body", ""), st.get("last_extra", "")
+# 投稿途中のスレッド（地点×日付ごと）
+journal = PostJournal(JOURNAL_PATH)
 
-def set_last_texts(body, extra):
-    st = load_state()
-    st["last_body"] = body
-    st["last_extra"] = extra
-    save_state(st)
+def journal_key(key, today):
+    return journal.thread_key(f"pressure:{key}", today)
 
-# =========================
-# 天気取得
-# =========================
-def fetch_weather():
-    url = (
-        "https://api.open-meteo.com/v1/forecast"
-        f"?latitude={SENDAI_LAT}"
-        f"&longitude={SENDAI_LON}"
-        "&hourly=surface_pressure,temperature_2m,relative_humidity_2m,dewpoint_2m"
-        "&timezone=Asia%2FTokyo"
-        "&forecast_days=2"
-    )
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    j = r.json()
-    return (
-        j["hourly"]["time"],
-        j["hourly"]["surface_pressure"],
-        j["hourly"]["temperature_2m"],
-        j["hourly"]["relative_humidity_2m"],
-        j["hourly"]["dewpoint_2m"],
-    )
+def pending_locations(today):
+    return [loc for loc in active_locations() if get_last_post_date(loc["key"]) != today]
 
 # =========================
-# 補助関数（AIの文字数オーバー対策）
+# 過去投稿との近似重複チェック（プロンプトに「前回」を渡す代わり）
 # =========================
-def split_by_sentence(text, limit=TWEET_LIMIT):
-    text = (text or "").strip()
-    if not text:
-        return []
-    if len(text) <= limit:
-        return [text]
-
-    parts = []
-    rest = text
-    while rest:
-        if len(rest) <= limit:
-            parts.append(rest)
+_dedup = None
+_dedup_lock = threading.Lock()
+
+def dedup_scope(kind, key):
+    # 地点ごと・本文/追加のひとことごとに比べる
+    return f"pressure:{kind}:{key}"
+
+def dedup():
+    """投稿済み本文の索引。numpy を使うので最初に使う時に読み込む（初回は状態ファイルの前回本文から作る）"""
+    global _dedup
+    with _dedup_lock:
+        if _dedup is None:
+            from dedup_index import NearDupIndex
+            idx = NearDupIndex(DEDUP_PATH)
+            if not len(idx):
+                with state.lock:
+                    locs = dict(state.data.get("locations") or {DEFAULT_LOCATION: state.data})
+                for key, ls in locs.items():
+                    for kind in ("body", "extra"):
+                        idx.add_many([(ls.get(f"last_{kind}", ""), (ls.get("last_post_date") or "")[:10])], dedup_scope(kind, key))
+            _dedup = idx
+        return _dedup
+
+def unique_text(generate, scope):
+    """
+    generate() の文が過去の投稿とほぼ同じなら作り直す（DUP_RETRY 回まで）。
+    作り直しても似ていれば、いちばん似ていないものを使う
+    """
+    best = None
+    for _ in range(1 + DUP_RETRY):
+        text = generate()
+        if not text:
+            return text
+        sim, day = dedup().query(text, scope)
+        if best is None or sim < best[0]:
+            best = (sim, text)
+        if sim < dedup().threshold:
             break
+        print(f"過去の投稿（{day}）とほぼ同じ（類似度 {sim:.2f}）→ 作り直し: {scope}")
+    return best[1]
 
-        window = rest[:limit]
-        cut = max(
-            window.rfind("。"),
-            window.rfind("！"),
-            window.rfind("？"),
-            window.rfind("、"),
-            window.rfind(" "),
-        )
-        if cut < 10:
-            cut = limit
-
-        take_len = cut + (1 if cut != limit else 0)
-        parts.append(rest[:take_len].strip())
-        rest = rest[take_len:].strip()
+def record_posted(key, today, body, extra):
+    # 投稿できた本文を索引に足す（失敗しても投稿は済んでいるので続ける）
+    try:
+        for kind, text in (("body", body), ("extra", extra)):
+            if text:
+                dedup().add(text, dedup_scope(kind, key), today.isoformat())
+    except Exception as e:
+        print(f"dedup index error ({key}): {e}")
 
-    return [p for p in parts if p]
+# =========================
+# 天気取得
+# =========================
+HOURLY_VARS = ["surface_pressure", "temperature_2m", "relative_humidity_2m", "dewpoint_2m"]
+
+@metrics.timed("fetch_weather")
+def fetch_weather(locs):
+    # 全地点を1リクエストでまとめて取得（weather_cache経由：セッション再利用・地点ごとのTTLと前回データ代用）
+    points = [(loc["lat"], loc["lon"]) for loc in locs]
+    results = weather_cache.fetch_forecast_many(points, HOURLY_VARS, forecast_days=2)
+    out = {}
+    for loc, j in zip(locs, results):
+        out[loc["key"]] = (
+            j["hourly"]["time"],
+            j["hourly"]["surface_pressure"],
+            j["hourly"]["temperature_2m"],
+            j["hourly"]["relative_humidity_2m"],
+            j["hourly"]["dewpoint_2m"],
+        )
+    return out
 
 # =========================
-# 判定ロジック
+# 補助関数（AIの文字数オーバー対策）
 # =========================
-def classify_pressure(base, h12, h18, h24):
-    vals = [base, h12, h18, h24]
-    day_range = max(vals) - min(vals)
-    delta = h24 - base
-
-    if day_range >= 8 or abs(delta) >= 7:
-        return 2, "変化大", day_range, delta
-    elif day_range >= 5 or abs(delta) >= 4:
-        return 1, "やや変化", day_range, delta
-    return 0, "穏やか", day_range, delta
-
-def classify_amplifier(temp_range, dew_max):
-    score = 0
-    if temp_range >= 7:
-        score += 1
-    if dew_max >= 16:
-        score += 1
-    return score
-
-def closing_style(total_level):
-    if total_level <= 1:
-        return "安心"
-    if total_level <= 3:
-        return "軽い注意"
-    return "注意喚起"
+def split_by_sentence(text, limit=TWEET_LIMIT):
+    # X換算（全角=2）の文字数で、文末 → 読点・空白の優先順に区切る
+    return segmenter.segment(text, limit * 2, min_len=20)
 
 # =========================
 # Gemini 設定＆生成ロジック
 # =========================
-SAFETY_SETTINGS = [
-    types.SafetySetting(
-        category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-        threshold=types.HarmBlockThreshold.BLOCK_ONLY_HIGH
-    ),
-    types.SafetySetting(
-        category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
-        threshold=types.HarmBlockThreshold.BLOCK_ONLY_HIGH
-    ),
-    types.SafetySetting(
-        category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-        threshold=types.HarmBlockThreshold.BLOCK_ONLY_HIGH
-    ),
-]
+def safety_settings(types):
+    return [
+        types.SafetySetting(
+            category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+            threshold=types.HarmBlockThreshold.BLOCK_ONLY_HIGH
+        ),
+        types.SafetySetting(
+            category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
+            threshold=types.HarmBlockThreshold.BLOCK_ONLY_HIGH
+        ),
+        types.SafetySetting(
+            category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+            threshold=types.HarmBlockThreshold.BLOCK_ONLY_HIGH
+        ),
+    ]
 
 def gemini_generate(prompt: str) -> str:
     try:
-        r = gen_client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=GEMINI_TEMP,
-                safety_settings=SAFETY_SETTINGS
+        types = clients.genai_types()
+        with metrics.timer("gemini_generate"):
+            r = gemini_hedge.generate_content(
+                clients.get_genai_client(),
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=GEMINI_TEMP,
+                    safety_settings=safety_settings(types)
+                )
             )
-        )
         text = (r.text or "").strip()
         # 改行などをスペースに潰す（改行禁止ルールの保険）
         return re.sub(r"\s+", " ", text)
@@ -220,9 +255,13 @@ def gemini_generate(prompt: str) -> str:
         print("Gemini error:", repr(e))
         return ""
 
-def gemini_body(material, prev_body: str = "", mmdd_text: str = ""):
+def gemini_body(material, mmdd_text: str = ""):
     # f-string中のクォート事故を避けるため先に展開
     style = closing_style(material["total_level"])
+    area = material.get("area", "仙台")
+    drop = material.get("max_drop_3h", 0.0)
+    steep_hour = material.get("drop_hour")
+    drop_line = f"\n・急な下がり：{steep_hour}時頃に3時間で{drop}hPa" if drop >= DROP_3H_MID and steep_hour is not None else ""
     pressure_label = material["pressure_label"]
     range_hpa = material["range"]
     delta_val = material["delta"]
@@ -233,10 +272,11 @@ def gemini_body(material, prev_body: str = "", mmdd_text: str = ""):
 あなたは天気予報キャスターです。以下のデータを使って、気圧痛に悩む方向けのX投稿文を作成してください。
 
 【データ】
+・地域：{area}
 ・日付：{mmdd_text}
 ・気圧変化：{pressure_label}（振れ幅 {range_hpa}hPa / 6→24時差 {delta_val:+d}hPa）
 ・気温差：{temp_range}℃
-・露点最大：{dew_max}℃
+・露点最大：{dew_max}℃{drop_line}
 ・アドバイス基準：{style}
 
 【構成（厳守）】
@@ -251,17 +291,15 @@ def gemini_body(material, prev_body: str = "", mmdd_text: str = ""):
 ・未来語（明日・週末など）禁止
 ・「露点」という語は使わない
 ・文頭に見出しや【】は付けない
-・前回（{prev_body if prev_body else "なし"}）とは違う表現
 ・改行なし
 """.strip()
 
     return gemini_generate(prompt)
 
-def gemini_extra(material, prev_extra: str = ""):
-    prompt = f"""
+def gemini_extra():
+    prompt = """
 気圧変動が強めの日の追加のひとことを70〜90文字程度で作成してください。
 です/ます調。不安を煽らない。
-前回（{prev_extra if prev_extra else "なし"}）とは違う表現にする。
 改行なし。見出しや【】は禁止。
 """.strip()
     return gemini_generate(prompt)
@@ -269,150 +307,331 @@ def gemini_extra(material, prev_extra: str = ""):
 # =========================
 # 投稿処理
 # =========================
-def post_forecast():
-    now = now_jst()
-    today = now.date()
-    mmdd_text = f"{now.month}月{now.day}日"
-
+def build_material(loc, series, today, features=None):
+    base = int(round(series.at_hour(today, 6)["pressure"]))
+
+    d12 = series.at_hour(today, 12)
+    d18 = series.at_hour(today, 18)
+    d24 = series.at_hour(today, 24)
+
+    h12 = int(round(d12["pressure"]))
+    h18 = int(round(d18["pressure"]))
+    h24 = int(round(d24["pressure"]))
+
+    # features があれば（PRESSURE_FEATURES=1）サンプル時刻の間の急な下降も判定に使う
+    pressure_level, label, day_range, delta = classify_pressure(base, h12, h18, h24, features)
+    raised = pressure_level > classify_pressure(base, h12, h18, h24)[0]
+
+    temp_vals = [d12["temp"], d18["temp"], d24["temp"]]
+    temp_range = int(round(max(temp_vals) - min(temp_vals)))
+    dew_max = int(round(max(d12["dew"], d18["dew"], d24["dew"])))
+
+    total_level = pressure_level + classify_amplifier(temp_range, dew_max)
+    max_drop = float(features["max_drop_3h"]) if features else 0.0
+    max_drop_6h = float(features["max_drop_6h"]) if features else 0.0
+
+    return {
+        "area": loc["label"],
+        "base": base,
+        "h12": h12,
+        "h18": h18,
+        "h24": h24,
+        "pressure_label": label,
+        "range": day_range,
+        "delta": delta,
+        "temp_range": temp_range,
+        "dew_max": dew_max,
+        "total_level": total_level,
+        "max_drop_3h": 0.0 if math.isnan(max_drop) else round(max_drop, 1),
+        "max_drop_6h": 0.0 if math.isnan(max_drop_6h) else round(max_drop_6h, 1),
+        # 3時間で最も下がった区間の終わりの時刻（急な下がりの文面用）
+        "drop_hour": features["drop_hour"] if features else None,
+        # 振れ幅・時差ではなく急な下降でレベルが上がった
+        "raised_by_drop": raised,
+    }
+
+def upload_banner():
+    # 画像アップロード（安全な取得とエラーハンドリング）
+    if not os.path.exists(BANNER_PATH):
+        return None
     try:
-        times, pressures, temps, hums, dews = fetch_weather()
-        times_dt = [datetime.fromisoformat(t).replace(tzinfo=TZ) for t in times]
-
-        tmap = {}
-        for t, p, tmp, h, dw in zip(times_dt, pressures, temps, hums, dews):
-            if p is None or tmp is None:
-                continue
-            tmap[t] = {
-                "pressure": float(p),
-                "temp": float(tmp),
-                "dew": float(dw) if dw else 0.0,
-            }
+        # 同じ画像なら有効期限内の media_id を使い回す（失効前に裏で上げ直す）
+        return media_cache.get_media_id(BANNER_PATH, clients.get_x_api_v1().media_upload)
+    except Exception as e:
+        print("media_upload error:", repr(e))
+        return None
 
-        if not tmap:
-            print("FATAL: weather map is empty")
-            return
+class SerialExecutor:
+    # PIPELINE_MODE=serial 用：submit した時点でその場で実行する
+    def submit(self, fn, *args, **kwargs):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def stage_executor():
+    if PIPELINE_MODE == "serial":
+        return SerialExecutor()
+    return ThreadPoolExecutor(max_workers=3)
+
+def start_stages(ex, material, key, mmdd_text):
+    """
+    本文・追加のひとこと・画像アップロードは互いに依存しないので同時に走らせる。
+    戻り値は (f_body, f_extra, f_media)。追加のひとことはレベル4以上のときだけ（それ以外は None）
+    """
+    f_body = ex.submit(unique_text, lambda: gemini_body(material, mmdd_text), dedup_scope("body", key))
+    f_extra = (
+        ex.submit(unique_text, gemini_extra, dedup_scope("extra", key))
+        if material["total_level"] >= 4 else None
+    )
+    f_media = ex.submit(upload_banner)
+    return f_body, f_extra, f_media
 
-        base_dt = datetime.combine(today, dtime(6, 0), TZ)
-        base_key = min(tmap.keys(), key=lambda k: abs((k - base_dt).total_seconds()))
-        base = int(round(tmap[base_key]["pressure"]))
-
-        def get_hour(hour):
-            if hour == 24:
-                dt = datetime.combine(today + timedelta(days=1), dtime(0, 0), TZ)
-            else:
-                dt = datetime.combine(today, dtime(hour, 0), TZ)
-            key = min(tmap.keys(), key=lambda k: abs((k - dt).total_seconds()))
-            return tmap[key]
-
-        d12 = get_hour(12)
-        d18 = get_hour(18)
-        d24 = get_hour(24)
-
-        h12 = int(round(d12["pressure"]))
-        h18 = int(round(d18["pressure"]))
-        h24 = int(round(d24["pressure"]))
-
-        pressure_level, label, day_range, delta = classify_pressure(base, h12, h18, h24)
-
-        temp_vals = [d12["temp"], d18["temp"], d24["temp"]]
-        temp_range = int(round(max(temp_vals) - min(temp_vals)))
-        dew_max = int(round(max(d12["dew"], d18["dew"], d24["dew"])))
-
-        total_level = pressure_level + classify_amplifier(temp_range, dew_max)
-
-        material = {
-            "pressure_label": label,
-            "range": day_range,
-            "delta": delta,
-            "temp_range": temp_range,
-            "dew_max": dew_max,
-            "total_level": total_level,
-        }
+def make_head(loc, material, today):
+    base = material["base"]
+    h12, h18, h24 = material["h12"], material["h18"], material["h24"]
+    return (
+        f"【{loc['label']}｜低気圧頭痛・気圧痛予報】{today.strftime('%m月%d日')}\n"
+        f"おはようございます。整体院コクリの今日の気圧痛予報です\n\n"
+        f"・12時{h12}hPa({h12-base:+d})\n"
+        f"・18時{h18}hPa({h18-base:+d})\n"
+        f"・24時{h24}hPa({h24-base:+d})\n"
+        f"（朝6時基準 {base}hPa）"
+    )
 
-        head = (
-            f"【仙台｜低気圧頭痛・気圧痛予報】{today.strftime('%m月%d日')}\n"
-            f"おはようございます。整体院コクリの今日の気圧痛予報です\n\n"
-            f"・12時{h12}hPa({h12-base:+d})\n"
-            f"・18時{h18}hPa({h18-base:+d})\n"
-            f"・24時{h24}hPa({h24-base:+d})\n"
-            f"（朝6時基準 {base}hPa）"
+def fallback_body(material, mmdd_text):
+    # 万が一AIが空文字を返した時の安全装置（表記は「2月19日」形式）
+    # 急な下降でレベルが上がった日は、その数値も書く（振れ幅だけだとラベルと合わない）
+    if material.get("raised_by_drop"):
+        hour = material.get("drop_hour")
+        when = f"{hour}時頃に" if hour is not None else ""
+        change = (
+            f"{when}3時間で{material['max_drop_3h']}hPa・6時間で{material['max_drop_6h']}hPaの急な下がりがあり、"
+            f"振れ幅{material['range']}hPaです。"
         )
+    else:
+        change = f"振れ幅{material['range']}hPa、6→24時差{material['delta']:+d}hPaです。"
+    return (
+        f"{mmdd_text}は気圧変化が{material['pressure_label']}で、{change}"
+        f"気温差は{material['temp_range']}℃です。無理のない範囲でお過ごしください。"
+    )
 
-        prev_body, prev_extra = get_last_texts()
+def create_part(part, parent_id):
+    # journal.post から1ツイートずつ呼ばれる。戻り値は新しいツイートID
+    params = {"text": part["text"], "user_auth": True}
+    if parent_id:
+        params["in_reply_to_tweet_id"] = parent_id
+    if part.get("media"):
+        media_id = part.get("media_id") or upload_banner()
+        if media_id:
+            params["media_ids"] = [media_id]
+    res = clients.get_x_client().create_tweet(**params)
+    return str(res.data["id"])
+
+def thread_parts(body, extra):
+    parts = [{"text": p, "label": "reply"} for p in split_by_sentence(body, TWEET_LIMIT)]
+    if extra:
+        parts += [{"text": p, "label": "extra"} for p in split_by_sentence(extra, TWEET_LIMIT)]
+    return parts
+
+def post_thread(jkey):
+    ok, _ = journal.post(jkey, create_part)
+    return ok
+
+def complete_location(key, today, jkey):
+    meta = journal.get(jkey)["meta"]
+    mark_posted(today, meta.get("body", ""), meta.get("extra", ""), key)
+    record_posted(key, today, meta.get("body", ""), meta.get("extra", ""))
+    journal.finish(jkey)
+    print(f"投稿完了: {key}")
+
+def post_location(loc, material, today, mmdd_text):
+    # 準備済みの投稿が無い（古い）ときの即時投稿
+    key = loc["key"]
+    jkey = journal_key(key, today)
+
+    with stage_executor() as ex:
+        f_body, f_extra, f_media = start_stages(ex, material, key, mmdd_text)
+
+        # 1ツイート目（head）は画像さえあれば出せる（本文の生成を待たない）。
+        # 前回 head だけ出て止まっていれば、ジャーナルの続きから（head は出し直さない）
+        head = {"text": make_head(loc, material, today), "label": "head", "media": True, "media_id": f_media.result()}
+        journal.begin(jkey, [head], sealed=False)
+        _, parent_id = journal.post(jkey, create_part)
+        if parent_id is None:
+            return
 
-        # 本文生成（末尾タグは付けない）
-        body = gemini_body(material, prev_body, mmdd_text)
+        # 本文（2ツイート目以降）と追加のひとこと（条件次第）。文字数対策（全角135字相当で分割）
+        body = f_body.result() or fallback_body(material, mmdd_text)
+        extra = f_extra.result() if f_extra else ""
+        journal.extend(jkey, thread_parts(body, extra), meta={"body": body, "extra": extra})
 
-        # 万が一AIが空文字を返した時の安全装置（表記は「2月19日」形式）
-        if not body:
-            body = (
-                f"{mmdd_text}は気圧変化が{label}で、振れ幅{day_range}hPa、6→24時差{delta:+d}hPaです。"
-                f"気温差は{temp_range}℃です。無理のない範囲でお過ごしください。"
-            )
+    if post_thread(jkey):
+        complete_location(key, today, jkey)
 
-        # 文字数対策（タグ無しなのでそのまま135で分割）
-        body_parts = split_by_sentence(body, TWEET_LIMIT)
+def prepare_location(loc, material, today, mmdd_text):
+    # 投稿に必要なもの（本文・分割・画像ID）を全部作って保存しておく
+    key = loc["key"]
 
-        # 追加のひとこと（条件次第）
-        extra = gemini_extra(material, prev_extra) if total_level >= 4 else ""
+    with stage_executor() as ex:
+        f_body, f_extra, f_media = start_stages(ex, material, key, mmdd_text)
 
-        # 画像アップロード（安全な取得とエラーハンドリング）
-        media_id = None
-        if os.path.exists(BANNER_PATH):
+        body = f_body.result() or fallback_body(material, mmdd_text)
+        extra = f_extra.result() if f_extra else ""
+        media_id = f_media.result()
+
+    body_parts = split_by_sentence(body, TWEET_LIMIT)
+    if not body_parts:
+        print(f"prepare error: empty body ({key})")
+        return None
+
+    staged = {
+        "date": today.isoformat(),
+        "prepared_at": now_jst().isoformat(timespec="seconds"),
+        "head": make_head(loc, material, today),
+        "body": body,
+        "body_parts": body_parts,
+        "extra": extra,
+        "extra_parts": split_by_sentence(extra, TWEET_LIMIT),
+        "media_id": media_id,
+    }
+    save_staged(staged, key)
+    print(f"準備完了: {key}")
+    return staged
+
+def publish_staged(loc, staged, today):
+    # 準備済みの投稿を create_tweet するだけ
+    key = loc["key"]
+    jkey = journal_key(key, today)
+    head = {"text": staged["head"], "label": "head", "media": True, "media_id": staged.get("media_id")}
+    parts = [{"text": p, "label": "reply"} for p in staged["body_parts"]]
+    parts += [{"text": p, "label": "extra"} for p in staged["extra_parts"]]
+    journal.begin(jkey, [head] + parts, meta={"body": staged["body"], "extra": staged["extra"]})
+
+    if post_thread(jkey):
+        complete_location(key, today, jkey)
+
+def resume_location(loc, today):
+    # 途中まで出したスレッドの続きだけを投稿する（取得・生成はしない）
+    key = loc["key"]
+    jkey = journal_key(key, today)
+    print(f"投稿再開: {key}（{len(journal.get(jkey)['ids'])}件投稿済み）")
+    if post_thread(jkey):
+        complete_location(key, today, jkey)
+
+def build_materials(locs, today):
+    # 全地点の天気を1回で取得 → 地点ごとに判定
+    weather = fetch_weather(locs)
+
+    series_by_key = {}
+    for loc in locs:
+        times, pressures, temps, hums, dews = weather[loc["key"]]
+        series = HourlySeries.from_arrays(times, pressures, temps, dews, TZ)
+        if series.is_empty():
+            print(f"FATAL: weather map is empty ({loc['key']})")
+            continue
+        series_by_key[loc["key"]] = series
+
+    keys = list(series_by_key)
+    if not PRESSURE_FEATURES:
+        return {
+            key: build_material(next(loc for loc in locs if loc["key"] == key), series_by_key[key], today)
+            for key in keys
+        }
+
+    # numpy は特徴量を使う時だけ読み込む（起動を軽くする）
+    import numpy as np
+    import pressure_features
+
+    # 6時〜24時の毎時の気圧から、全地点分の特徴量をまとめて計算
+    windows = [series_by_key[k].window(today, 6, 24) for k in keys]
+    width = max((len(w) for _, w in windows), default=0)
+    grid = np.full((len(keys), width), np.nan)
+    for row, (_, w) in enumerate(windows):
+        grid[row, :len(w)] = w
+    feats = pressure_features.extract(grid) if keys else {}
+
+    materials = {}
+    for row, key in enumerate(keys):
+        f = {name: v[row] for name, v in feats.items()}
+        i0 = windows[row][0]
+        drop_i = int(f["steepest_drop_idx"])
+        f["drop_hour"] = series_by_key[key].time_at(i0 + drop_i).hour if drop_i >= 0 else None
+        loc = next(loc for loc in locs if loc["key"] == key)
+        materials[key] = build_material(loc, series_by_key[key], today, f)
+    return materials
+
+def run_per_location(fn, tasks):
+    # 地点ごとの処理を並行して走らせる。tasks: [(key, args), ...]
+    if not tasks:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(len(tasks), PRESSURE_MAX_WORKERS))) as ex:
+        futures = {key: ex.submit(fn, *args) for key, args in tasks}
+        for key, fut in futures.items():
             try:
-                media = x_api_v1.media_upload(BANNER_PATH)
-                media_id = getattr(media, "media_id_string", None) or str(media.media_id)
+                fut.result()
             except Exception as e:
-                print("media_upload error:", repr(e))
-                media_id = None
+                print(f"FATAL ({key}):", repr(e))
 
-        # 1ツイート目（head）
-        tweet_params = {"text": head, "user_auth": True}
-        if media_id:
-            tweet_params["media_ids"] = [media_id]
+def prepare_forecast():
+    now = now_jst()
+    today = now.date()
+    mmdd_text = f"{now.month}月{now.day}日"
 
-        first = x_client.create_tweet(**tweet_params)
-        parent_id = str(first.data["id"])
+    try:
+        locs = [
+            loc for loc in pending_locations(today)
+            if not get_staged(today, loc["key"]) and not journal.get(journal_key(loc["key"], today))
+        ]
+        if not locs:
+            return
 
-        time.sleep(REPLY_WAIT_SEC)
-        ok = True
+        materials = build_materials(locs, today)
+        run_per_location(prepare_location, [
+            (loc["key"], (loc, materials[loc["key"]], today, mmdd_text))
+            for loc in locs if loc["key"] in materials
+        ])
 
-        # 本文（2ツイート目以降）
-        for p in body_parts:
-            try:
-                res = x_client.create_tweet(
-                    text=p,
-                    in_reply_to_tweet_id=parent_id,
-                    user_auth=True
-                )
-                parent_id = str(res.data["id"])
-                time.sleep(REPLY_WAIT_SEC)
-            except Exception as e:
-                print("reply error:", repr(e))
-                ok = False
-                break
-
-        # 追加のひとこと
-        if ok and extra:
-            extra_parts = split_by_sentence(extra, TWEET_LIMIT)
-            for ep in extra_parts:
-                try:
-                    res = x_client.create_tweet(
-                        text=ep,
-                        in_reply_to_tweet_id=parent_id,
-                        user_auth=True
-                    )
-                    parent_id = str(res.data["id"])
-                    time.sleep(REPLY_WAIT_SEC)
-                except Exception as e:
-                    print("extra error:", repr(e))
-                    ok = False
-                    break
-
-        if ok:
-            set_last_post_date(today)
-            set_last_texts(body, extra)
-            print("投稿完了")
+    except Exception as e:
+        print("FATAL:", repr(e))
+
+def post_forecast(force=False):
+    now = now_jst()
+    today = now.date()
+    mmdd_text = f"{now.month}月{now.day}日"
+
+    try:
+        locs = active_locations() if force else pending_locations(today)
+        if not locs:
+            return
+
+        # 途中まで出したスレッドは続きから、準備済みのものはそのまま投稿、
+        # 無い（古い）ものはここで作り直して投稿（head だけ出ていればその続きに本文をつなぐ）
+        threads = {loc["key"]: journal.get(journal_key(loc["key"], today)) for loc in locs}
+        resume = [loc for loc in locs if threads[loc["key"]] and threads[loc["key"]]["sealed"]]
+        rest = [loc for loc in locs if loc not in resume]
+        staged = {loc["key"]: None if threads[loc["key"]] else get_staged(today, loc["key"]) for loc in rest}
+        ready = [loc for loc in rest if staged[loc["key"]]]
+        refresh = [loc for loc in rest if not staged[loc["key"]]]
+
+        tasks = [(loc["key"], (resume_location, (loc, today))) for loc in resume]
+        tasks += [(loc["key"], (publish_staged, (loc, staged[loc["key"]], today))) for loc in ready]
+        if refresh:
+            materials = build_materials(refresh, today)
+            tasks += [
+                (loc["key"], (post_location, (loc, materials[loc["key"]], today, mmdd_text)))
+                for loc in refresh if loc["key"] in materials
+            ]
+
+        run_per_location(lambda fn, args: fn(*args), tasks)
 
     except Exception as e:
         print("FATAL:", repr(e))
@@ -422,19 +641,36 @@ def post_forecast():
 # =========================
 def run_bot():
     print("BOT起動:", now_jst())
+    metrics.start_server()
 
     if FORCE_POST:
-        post_forecast()
+        post_forecast(force=True)
         return
 
     if DEPLOY_RUN:
-        if get_last_post_date() != now_jst().date():
+        if pending_locations(now_jst().date()):
             post_forecast()
 
-    while True:
-        if get_last_post_date() != now_jst().date() and now_jst().hour >= POST_HOUR:
-            post_forecast()
-        time.sleep(60)
+    # 準備枠（POST_HOUR の PREPARE_LEAD_MIN 分前）と投稿枠まで眠る。
+    # 未投稿の地点が残っていれば RETRY_SEC ごとに再実行
+    post_time = f"{POST_HOUR:02d}:00"
+    lead = min(PREPARE_LEAD_MIN, POST_HOUR * 60)
+    prep_dt = datetime.combine(now_jst().date(), dtime(POST_HOUR, 0)) - timedelta(minutes=lead)
+    prepare_time = prep_dt.strftime("%H:%M")
+
+    def job(base, run_dt, late):
+        if base == prepare_time and base != post_time:
+            prepare_forecast()
+            return True
+        post_forecast()
+        return not pending_locations(now_jst().date())
+
+    scheduler = DailyScheduler(
+        [prepare_time, post_time], TZ,
+        retry_sec=RETRY_SEC,
+        name="pressure",
+    )
+    scheduler.run_forever(job)
 
 if __name__ == "__main__":
     run_bot()
@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+
+import tweepy
+
+import metrics
+from state_store import StateStore
+
+# =========================
+# 基本設定
+# =========================
+RATE_LIMIT_STATE_PATH = os.getenv("RATE_LIMIT_STATE_PATH", "rate_limit_state.json")
+# まとめて即時に出してよい回数（スレッド1本分が待たずに出る程度）
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+
+# X が返す残り回数ヘッダ（15分窓・24時間窓）
+HEADER_WINDOWS = [
+    ("15min", "x-rate-limit-remaining", "x-rate-limit-reset", "x-rate-limit-limit"),
+    ("user24h", "x-user-limit-24hour-remaining", "x-user-limit-24hour-reset", "x-user-limit-24hour-limit"),
+    ("app24h", "x-app-limit-24hour-remaining", "x-app-limit-24hour-reset", "x-app-limit-24hour-limit"),
+]
+# 補充速度を決める窓。24時間窓は上限としてだけ使う（使い切ったらリセットまで止める）。
+# 24時間窓で速度を決めると1日の枠を24時間に均すことになり、スレッドの2ツイート目が何十分も待たされる
+PACING_WINDOWS = ("15min",)
+
+def endpoint_key(method, route):
+    # /2/users/123/likes → /2/users/:id/likes（IDごとに別枠にしない）
+    parts = route.split("?")[0].split("/")
+    parts = [":id" if i > 1 and p.isdigit() else p for i, p in enumerate(parts)]
+    return f"{method.upper()} " + "/".join(parts)
+
+# =========================
+# トークンバケット（残り回数とリセット時刻から補充速度を決める）
+# =========================
+class RateLimiter:
+    """
+    エンドポイントごとに、15分窓の remaining / reset から
+    「リセットまでに残りを使い切る速度」でトークンを補充する（24時間窓は上限だけ）。
+    burst 回までは待たずに出せる。状態はファイルに残して再起動後も引き継ぐ。
+    """
+
+    def __init__(self, path=RATE_LIMIT_STATE_PATH, burst=RATE_LIMIT_BURST, min_interval=None):
+        self.store = StateStore(path, {"endpoints": {}})
+        self.burst = burst
+        # エンドポイントごとの最短間隔（秒）。例: {"POST /2/users/:id/likes": 60}
+        self.min_interval = dict(min_interval or {})
+        self.lock = threading.Lock()
+
+    def _ep(self, key):
+        return self.store.data["endpoints"].setdefault(key, {
+            "windows": {},
+            "tokens": float(self.burst),
+            "updated": time.time(),
+            "last_request": 0.0,
+        })
+
+    def _wait_sec(self, ep, key, now):
+        # 使い切った窓があればリセットまで待つ
+        rate = None
+        cap = float(self.burst)
+        for name, w in ep["windows"].items():
+            if w["reset"] <= now:
+                continue
+            if w["remaining"] <= 0:
+                return w["reset"] - now + 1
+            cap = min(cap, float(w["remaining"]))
+            if name not in PACING_WINDOWS:
+                continue
+            r = w["remaining"] / (w["reset"] - now)
+            rate = r if rate is None else min(rate, r)
+
+        wait = 0.0
+        floor = self.min_interval.get(key)
+        if floor:
+            wait = max(wait, ep["last_request"] + floor - now)
+
+        if rate is None:
+            # ヘッダ未取得・窓リセット済み：制限なしとして満タンに戻す
+            ep["tokens"] = float(self.burst)
+        else:
+            ep["tokens"] = min(cap, ep["tokens"] + (now - ep["updated"]) * rate)
+            if ep["tokens"] < 1:
+                wait = max(wait, (1 - ep["tokens"]) / rate)
+        ep["updated"] = now
+        return wait
+
+    def acquire(self, key):
+        while True:
+            with self.lock:
+                now = time.time()
+                ep = self._ep(key)
+                wait = self._wait_sec(ep, key, now)
+                if wait <= 0:
+                    ep["tokens"] = max(ep["tokens"] - 1, 0.0)
+                    ep["last_request"] = now
+                    for w in ep["windows"].values():
+                        if w["reset"] > now:
+                            w["remaining"] -= 1
+                    return
+            print(f"rate limit: {key} {wait:.1f}秒待機")
+            time.sleep(wait)
+
+    def update(self, key, headers):
+        windows = {}
+        for name, rem_h, reset_h, limit_h in HEADER_WINDOWS:
+            if rem_h not in headers or reset_h not in headers:
+                continue
+            try:
+                windows[name] = {
+                    "remaining": int(headers[rem_h]),
+                    "reset": float(headers[reset_h]),
+                    "limit": int(headers.get(limit_h, 0) or 0),
+                }
+            except (TypeError, ValueError):
+                continue
+        if not windows:
+            return
+        with self.lock:
+            with self.store.transaction():
+                ep = self._ep(key)
+                ep["windows"].update(windows)
+                # 期限切れの窓は捨てる
+                now = time.time()
+                ep["windows"] = {k: w for k, w in ep["windows"].items() if w["reset"] > now}
+
+# =========================
+# tweepy クライアントのラッパー
+# =========================
+class RateLimitedClient(tweepy.Client):
+    """tweepy.Client の全リクエストを limiter 経由にする"""
+
+    def __init__(self, *args, limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter or get_limiter()
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        key = endpoint_key(method, route)
+        self.limiter.acquire(key)
+        try:
+            with metrics.timer("x_api", endpoint=key):
+                response = super().request(method, route, params=params, json=json, user_auth=user_auth)
+        except tweepy.HTTPException as e:
+            self.limiter.update(key, e.response.headers)
+            raise
+        self.limiter.update(key, response.headers)
+        return response
+
+class RateLimitedAPI(tweepy.API):
+    """tweepy.API（v1.1：media_upload 等）用"""
+
+    def __init__(self, *args, limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter or get_limiter()
+
+    def request(self, method, endpoint, **kwargs):
+        key = endpoint_key(method, "/1.1/" + endpoint)
+        self.limiter.acquire(key)
+        try:
+            with metrics.timer("x_api", endpoint=key):
+                return super().request(method, endpoint, **kwargs)
+        finally:
+            if getattr(self, "last_response", None) is not None:
+                self.limiter.update(key, self.last_response.headers)
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    # プロセス内で1つを共有する
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
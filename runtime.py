@@ -0,0 +1,73 @@
+import os
+import sys
+import signal
+import asyncio
+import importlib
+from datetime import datetime
+
+import metrics
+
+# =========================
+# 3つのBOTを1プロセス・1つのイベントループで動かす
+#   python runtime.py
+# 各BOTの run_bot（眠って待つ常駐ループ）をスレッドで動かし、ループ側で見張る。
+# クライアント（tweepy / genai）と HTTP 接続プールは clients / weather_cache がプロセス内で共有する
+# =========================
+BOTS = {
+    "pressure": "pressure_forecast_bot",
+    "auto_gen_x": "auto_gen_x",
+    "sendai": "sendai_target_search",
+}
+# 動かすBOT（カンマ区切り）
+RUNTIME_BOTS = [b.strip() for b in os.getenv("RUNTIME_BOTS", ",".join(BOTS)).split(",") if b.strip()]
+# 異常終了したBOTを再起動するまでの秒数
+RUNTIME_RESTART_SEC = int(os.getenv("RUNTIME_RESTART_SEC", "60"))
+
+def log(msg):
+    print(f"[runtime {datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+async def supervise(name):
+    """
+    run_bot を別スレッドで動かす。例外で落ちたら RUNTIME_RESTART_SEC 後に起動し直す。
+    正常に戻った（FORCE_POST の1回実行など）ときはそのまま終える。
+    sendai は1日の上限に達しても戻らず、翌日（JST）に続きから動く。
+    """
+    while True:
+        try:
+            module = importlib.import_module(BOTS[name])
+            log(f"{name} 起動")
+            await asyncio.to_thread(module.run_bot)
+            log(f"{name} 終了")
+            return
+        except Exception as e:
+            log(f"{name} 異常終了: {e!r}（{RUNTIME_RESTART_SEC}秒後に再起動）")
+            await asyncio.sleep(RUNTIME_RESTART_SEC)
+
+def shutdown(signum):
+    # run_bot のスレッドは止められないので、その場でプロセスを終える
+    # （状態ファイルは StateStore がアトミックに書くので途中で切れても壊れない）
+    log(f"signal {signum}: 終了します")
+    os._exit(0)
+
+async def main():
+    unknown = [b for b in RUNTIME_BOTS if b not in BOTS]
+    if unknown:
+        log(f"unknown bot: {unknown}（{', '.join(BOTS)} から選ぶ）")
+        return 1
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, shutdown, sig)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    # /metrics は全BOTで1つ（web プロセスの PORT）
+    metrics.start_server()
+    log(f"BOT: {', '.join(RUNTIME_BOTS)}")
+    await asyncio.gather(*(supervise(name) for name in RUNTIME_BOTS))
+    log("全BOTが終了しました")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
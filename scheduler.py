@@ -0,0 +1,114 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+# 時計のずれ・スリープ復帰に備えて、1回に眠るのは最長でこの秒数まで
+MAX_SLEEP_SEC = 3600
+
+def parse_hhmm(hhmm: str):
+    h, m = map(int, hhmm.split(":"))
+    return h, m
+
+# =========================
+# 期限駆動スケジューラ（次の予定時刻までちょうど眠る）
+# =========================
+class DailyScheduler:
+    """
+    1日ごとの実行予定（±揺らぎ込み）を作り、次の予定時刻まで眠って job を呼ぶ。
+    ・予定時刻を過ぎていて未実行の枠は、起動直後でもすぐ実行する（取り逃し救済）
+    ・job が False を返したら retry_sec 後に同じ日のうちに再実行する
+    ・wake() で途中で起こせる（予定を計算し直す）。stop() で run_forever を抜ける
+    """
+
+    def __init__(self, times, tz, jitter_minutes=0, window_minutes=5, retry_sec=None,
+                 on_plan=None, name="scheduler"):
+        self.times = list(times)
+        self.tz = tz
+        self.jitter_minutes = jitter_minutes
+        self.window = timedelta(minutes=window_minutes)
+        self.retry_sec = retry_sec
+        self.on_plan = on_plan
+        self.name = name
+
+        self.day = None
+        self.runs = []
+        self.done = set()
+        self.next_run = None
+        self._announced = None
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def plan(self, day):
+        runs = []
+        for base in self.times:
+            h, m = parse_hhmm(base)
+            base_dt = datetime(day.year, day.month, day.day, h, m, tzinfo=self.tz)
+            offset = random.randint(-self.jitter_minutes, self.jitter_minutes) if self.jitter_minutes else 0
+            runs.append((base, base_dt + timedelta(minutes=offset)))
+        runs.sort(key=lambda x: x[1])
+        self.day = day
+        self.runs = runs
+        self.done.clear()
+        if self.on_plan:
+            self.on_plan(runs)
+
+    def retry_in(self, seconds, base="retry"):
+        run_dt = datetime.now(self.tz) + timedelta(seconds=seconds)
+        self.runs.append((base, run_dt))
+        self.runs.sort(key=lambda x: x[1])
+        self.wake()
+
+    def next_due(self, now):
+        """(base, run_dt) を返す。今日の枠が全部終わっていたら (None, 翌日0時)"""
+        if self.day != now.date():
+            self.plan(now.date())
+
+        for base, run_dt in self.runs:
+            if run_dt.isoformat() in self.done:
+                continue
+            return base, run_dt
+
+        tomorrow = now.date() + timedelta(days=1)
+        return None, datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=self.tz)
+
+    def wait_next(self):
+        """
+        次の枠まで眠る。実行すべき枠に達したら (base, run_dt, late) を返し、
+        それ以外（日付の切り替え・wake()・長い眠りの区切り）は None を返す。
+        """
+        now = datetime.now(self.tz)
+        base, due = self.next_due(now)
+        self.next_run = due
+
+        if due > now:
+            if base is not None and self._announced != due:
+                print(f"⏳ [{self.name}] 次回実行予定(JST): {due.strftime('%Y-%m-%d %H:%M:%S')}")
+                self._announced = due
+            timeout = min((due - now).total_seconds(), MAX_SLEEP_SEC)
+            self._wake.wait(timeout)
+            self._wake.clear()
+            return None
+
+        if base is None:
+            return None
+
+        self.done.add(due.isoformat())
+        late = now > due + self.window
+        return base, due, late
+
+    def run_forever(self, job):
+        """job(base, run_dt, late) を予定どおり呼び続ける"""
+        while not self._stopped:
+            slot = self.wait_next()
+            if slot is None:
+                continue
+            ok = job(*slot)
+            if ok is False and self.retry_sec:
+                self.retry_in(self.retry_sec)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
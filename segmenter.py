@@ -0,0 +1,149 @@
+import re
+import unicodedata
+from bisect import bisect_right
+from itertools import accumulate
+
+# =========================
+# X の重み付き文字数（twitter-text v3 の設定）
+# =========================
+# 下の範囲（ラテン文字・一部の記号）は1、それ以外（日本語など）は2として数える
+MAX_WEIGHTED_LENGTH = 280
+URL_WEIGHT = 23
+_LIGHT_RANGES = ((0, 4351), (8192, 8205), (8208, 8223), (8242, 8247))
+
+URL_RE = re.compile(r"https?://[^\s　]+")
+
+# 区切りの優先度：文末 → 読点・空白 → それでも無ければ文字数で切る
+STRONG_BREAKS = frozenset("。！？!?\n")
+WEAK_BREAKS = frozenset("、，,　 ")
+
+# 重み2の文字が続く区間（_LIGHT_RANGES の外側）
+HEAVY_RE = re.compile("[^" + "".join(
+    f"\\U{lo:08x}-\\U{hi:08x}" for lo, hi in _LIGHT_RANGES
+) + "]+")
+STRONG_RE = re.compile("[" + re.escape("".join(sorted(STRONG_BREAKS))) + "]")
+WEAK_RE = re.compile("[" + re.escape("".join(sorted(WEAK_BREAKS))) + "]")
+
+def char_weight(ch):
+    cp = ord(ch)
+    for lo, hi in _LIGHT_RANGES:
+        if lo <= cp <= hi:
+            return 1
+    return 2
+
+def _drop_inside(positions, spans):
+    # どちらも昇順なので、1回なめるだけで URL 内の区切りを落とせる
+    out = []
+    j = 0
+    for p in positions:
+        while j < len(spans) and spans[j][1] < p:
+            j += 1
+        if j < len(spans) and spans[j][0] < p <= spans[j][1]:
+            continue
+        out.append(p)
+    return out
+
+def _scan(text):
+    """
+    「重みの累積和」と「区切り位置（その文字の直後）」を作る。
+    文字ごとの処理は正規表現・bytearray・accumulate に任せて Python のループを回さない。
+    URL は全体で23として数え、途中では区切らない。
+    """
+    weights = bytearray(b"\x01") * len(text)
+    for m in HEAVY_RE.finditer(text):
+        weights[m.start():m.end()] = b"\x02" * (m.end() - m.start())
+
+    url_spans = [m.span() for m in URL_RE.finditer(text)]
+    for s, e in url_spans:
+        weights[s:e] = bytes(e - s)
+        weights[s] = URL_WEIGHT
+
+    strong = [m.end() for m in STRONG_RE.finditer(text)]
+    weak = [m.end() for m in WEAK_RE.finditer(text)]
+    if url_spans:
+        strong = _drop_inside(strong, url_spans)
+        weak = _drop_inside(weak, url_spans)
+
+    cum = list(accumulate(weights, initial=0))
+    return cum, strong, weak
+
+def weighted_length(text):
+    text = unicodedata.normalize("NFC", text or "")
+    return _scan(text)[0][-1]
+
+def _fit(cum, start, limit):
+    # start から重み limit 以内に収まる最も遠い位置（最低1文字は進める）
+    end = bisect_right(cum, cum[start] + limit) - 1
+    return max(end, start + 1)
+
+def _last_break(breaks, start, end, cum, min_len):
+    i = bisect_right(breaks, end) - 1
+    if i >= 0 and breaks[i] > start and cum[breaks[i]] - cum[start] >= min_len:
+        return breaks[i]
+    return None
+
+def truncate(text, limit):
+    """重み付き文字数 limit に収まるように末尾を切る"""
+    text = unicodedata.normalize("NFC", text or "")
+    cum, _, _ = _scan(text)
+    if cum[-1] <= limit:
+        return text
+    return text[:bisect_right(cum, limit) - 1].rstrip()
+
+def truncate_sentences(text, limit):
+    """limit に収まる最後の文末で切る（収まる文末が無ければ truncate と同じ）"""
+    text = unicodedata.normalize("NFC", text or "")
+    cum, strong, _ = _scan(text)
+    if cum[-1] <= limit:
+        return text
+    fits = [p for p in strong if cum[p] <= limit]
+    if not fits:
+        return truncate(text, limit)
+    return text[:fits[-1]].rstrip()
+
+# =========================
+# 分割（1回の走査＋二分探索）
+# =========================
+def segment(text, limit, min_len=20, max_parts=None):
+    """
+    text を重み付き文字数 limit 以内のパーツに分ける。
+    各パーツは文末 → 読点・空白の順で、min_len 以上の位置にある最後の区切りで切る。
+    max_parts を指定した場合、最後のパーツは limit に収まる最後の文末まで（残りの文は捨てる）。
+    収まる文末が無いときだけ文字で切る。
+    """
+    text = unicodedata.normalize("NFC", text or "").strip()
+    if not text:
+        return []
+
+    cum, strong, weak = _scan(text)
+    n = len(text)
+    if cum[n] <= limit:
+        return [text]
+
+    parts = []
+    start = 0
+    while start < n:
+        while start < n and text[start].isspace():
+            start += 1
+        if start >= n:
+            break
+
+        if cum[n] - cum[start] <= limit:
+            parts.append(text[start:].strip())
+            break
+
+        end = _fit(cum, start, limit)
+        if max_parts and len(parts) == max_parts - 1:
+            cut = _last_break(strong, start, end, cum, 0) or end
+            parts.append(text[start:cut].strip())
+            break
+
+        cut = (
+            _last_break(strong, start, end, cum, min_len)
+            or _last_break(weak, start, end, cum, min_len)
+            or end
+        )
+        parts.append(text[start:cut].strip())
+        start = cut
+
+    return [p for p in parts if p]
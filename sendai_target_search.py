@@ -1,83 +1,181 @@
 import os
+import json
 import time
-import random
 from datetime import datetime
-import tweepy
-from google import genai
-from google.genai import types
-
-# --- Railwayの環境変数から取得（プログラムには直接書かない） ---
-X_API_KEY = os.getenv("API_KEY")
-X_API_SECRET = os.getenv("API_SECRET")
-X_ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
-X_ACCESS_SECRET = os.getenv("ACCESS_TOKEN_SECRET")
-X_BEARER_TOKEN = os.getenv("X_BEARER_TOKEN") # 検索に必要なので追加
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+from zoneinfo import ZoneInfo
+
+import metrics
+import clients
+import gemini_hedge
+import verdict_cache
+import keyword_filter
+
+# --- APIキーはRailwayの環境変数から clients が読む（プログラムには直接書かない） ---
+# API_KEY / API_SECRET / ACCESS_TOKEN / ACCESS_TOKEN_SECRET / X_BEARER_TOKEN（検索用） / GEMINI_API_KEY
 
 # --- 運用ルール ---
 TARGET_ACCOUNT = "sendai_tushin"
 DAILY_LIMIT = 50
+TZ = ZoneInfo("Asia/Tokyo")
 MODEL_NAME = "gemini-3-flash-preview"
+# 1回の Gemini 呼び出しでまとめて判定する人数と、答えが欠けた人を聞き直す回数
+CLASSIFY_BATCH = int(os.getenv("CLASSIFY_BATCH", "25"))
+CLASSIFY_RETRY = int(os.getenv("CLASSIFY_RETRY", "2"))
+# いいねの最短間隔（秒）。実際の間隔は残り回数とリセット時刻から rate_limiter が決める
+LIKE_MIN_INTERVAL_SEC = int(os.getenv("LIKE_MIN_INTERVAL_SEC", "60"))
+
+# クライアントは初回使用時に生成（起動時に tweepy / genai を読み込まない）
+clients.set_min_interval("POST /2/users/:id/likes", LIKE_MIN_INTERVAL_SEC)
+
+TARGET_RULE = "「仙台市（太白区・若林区・宮城野区・青葉区）」に住んでおり、かつ「自律神経、疲れ、肩こり、頭痛」などの悩みを持っていそうか"
+
+# =========================
+# まとめて判定（1回の Gemini 呼び出しで CLASSIFY_BATCH 人分。JSON で返させる）
+# =========================
+VERDICT_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"id": {"type": "STRING"}, "target": {"type": "BOOLEAN"}},
+        "required": ["id", "target"],
+    },
+}
 
-# クライアント初期化
-gen_client = genai.Client(api_key=GEMINI_API_KEY)
-x_client = tweepy.Client(
-    bearer_token=X_BEARER_TOKEN,
-    consumer_key=X_API_KEY,
-    consumer_secret=X_API_SECRET,
-    access_token=X_ACCESS_TOKEN,
-    access_token_secret=X_ACCESS_SECRET
-)
-
-def ask_gemini_if_target(profile):
-    """Gemini 3 Flash にターゲット判定を依頼"""
+def parse_verdicts(text, ids):
+    """[{"id": ..., "target": true/false}, ...] のうち、聞いた id で形の正しいものだけ {id: bool} で返す"""
+    try:
+        data = json.loads(text or "")
+    except ValueError:
+        return {}
+    if not isinstance(data, list):
+        return {}
+    out = {}
+    for item in data:
+        if isinstance(item, dict) and item.get("id") in ids and isinstance(item.get("target"), bool):
+            out[item["id"]] = item["target"]
+    return out
+
+def _classify_call(profiles):
+    # profiles: {短いid: プロフィール}。X のユーザーIDは長くて写し間違えやすいので p1, p2… で渡す
+    listing = json.dumps([{"id": k, "profile": v} for k, v in profiles.items()], ensure_ascii=False)
     prompt = f"""
-    以下のXユーザーが「仙台市（太白区・若林区・宮城野区・青葉区）」に住んでおり、
-    かつ「自律神経、疲れ、肩こり、頭痛」などの悩みを持っていそうか判定してください。
-    【プロフィール】: {profile}
-    回答は必ず「YES」か「NO」の1単語だけで答えてください。
+    以下のXユーザーそれぞれについて、{TARGET_RULE}判定してください。
+    【ユーザー一覧（JSON）】: {listing}
+    全員分を、id と target（当てはまれば true）の JSON 配列で答えてください。
     """
-    try:
-        response = gen_client.models.generate_content(
+    types = clients.genai_types()
+    with metrics.timer("classify_profiles", size=str(len(profiles))):
+        response = gemini_hedge.generate_content(
+            clients.get_genai_client(),
             model=MODEL_NAME,
-            contents=prompt
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=VERDICT_SCHEMA,
+            ),
         )
-        return "YES" in response.text.upper()
-    except Exception as e:
-        print(f"Gemini Error: {e}")
-        return False
+    return parse_verdicts(response.text, set(profiles))
+
+def classify_profiles(descriptions):
+    """
+    {ユーザーID: プロフィール} をまとめて判定し {ユーザーID: True/False} を返す。
+    答えが欠けた・形が崩れた人だけを CLASSIFY_RETRY 回まで聞き直す。最後まで欠けた人は入らない
+    """
+    short = {f"p{i + 1}": uid for i, uid in enumerate(descriptions)}
+    pending = {k: descriptions[uid] for k, uid in short.items()}
+    verdicts = {}
+    for attempt in range(1 + CLASSIFY_RETRY):
+        if not pending:
+            break
+        try:
+            got = _classify_call(pending)
+        except Exception as e:
+            print(f"Gemini Error: {e}")
+            got = {}
+        for k, v in got.items():
+            verdicts[short[k]] = v
+            del pending[k]
+        if pending and attempt < CLASSIFY_RETRY:
+            print(f"判定の欠け {len(pending)}件 → 聞き直し")
+    return verdicts
+
+def crawl_once(today_likes):
+    """対象アカウントの最新ツイートのリツイート者を1巡判定する。戻り値は更新後のいいね数"""
+    x_client = clients.get_x_client()
+    target_user = x_client.get_user(username=TARGET_ACCOUNT)
+    tweets = x_client.get_users_tweets(target_user.data.id, max_results=5)
+
+    if tweets.data:
+        users = x_client.get_retweeters(tweets.data[0].id, user_fields=["description"])
+
+        if users.data:
+            new_verdicts = {}
+            try:
+                # 地名・悩みの語が1つも無いプロフィールは Gemini に聞かずに落とす
+                candidates = [u for u in users.data if keyword_filter.is_candidate(u.description)]
+                metrics.inc("prefilter", len(candidates), result="pass")
+                metrics.inc("prefilter", len(users.data) - len(candidates), result="drop")
+
+                # CLASSIFY_BATCH 人ずつ：キャッシュに無い人だけまとめて判定 → 当てはまる人にいいね
+                for i in range(0, len(candidates), CLASSIFY_BATCH):
+                    if today_likes >= DAILY_LIMIT: break
+                    chunk = candidates[i:i + CLASSIFY_BATCH]
+
+                    verdicts = {}
+                    unknown = {}
+                    for u in chunk:
+                        v = verdict_cache.lookup(u.id, u.description or "")
+                        if v is None:
+                            unknown[u.id] = u.description or ""
+                        else:
+                            verdicts[u.id] = v
+                    if unknown:
+                        got = classify_profiles(unknown)
+                        verdicts.update(got)
+                        new_verdicts.update({uid: (unknown[uid], v) for uid, v in got.items()})
+
+                    for u in chunk:
+                        if today_likes >= DAILY_LIMIT: break
+
+                        if verdicts.get(u.id):
+                            try:
+                                x_client.like(tweets.data[0].id)
+                                today_likes += 1
+                                print(f"[{today_likes}] {u.username} さんを判定→いいね完了")
+                            except: continue
+            finally:
+                verdict_cache.save(new_verdicts)
+            print(f"判定：{len(users.data)}人中 {len(candidates)}人が候補 / Gemini で判定したのは {len(new_verdicts)}件")
+    return today_likes
 
 def run_bot():
+    # いいね数は JST の日付ごと。上限に達したら翌日まで待って続ける（プロセスは終えない）
+    day = datetime.now(TZ).date()
     today_likes = 0
-    print(f"[{datetime.now()}] 2026年型いいね集客システム始動。目標:{DAILY_LIMIT}件")
+    print(f"[{datetime.now(TZ)}] 2026年型いいね集客システム始動。目標:{DAILY_LIMIT}件/日")
+    # web プロセスなので PORT で /metrics を公開する
+    metrics.start_server()
+
+    while True:
+        now = datetime.now(TZ)
+        if now.date() != day:
+            day = now.date()
+            today_likes = 0
+            print(f"[{now}] 日付が変わったので、いいね数をリセット")
+
+        if today_likes >= DAILY_LIMIT:
+            print("本日のいいね上限に達しました。翌日まで待機...")
+            time.sleep(1800)
+            continue
 
-    while today_likes < DAILY_LIMIT:
-        now_hour = datetime.now().hour
         # 夜間（23時〜7時）はスリープ
-        if not (7 <= now_hour < 23):
+        if not (7 <= now.hour < 23):
             print("夜間モード：待機中...")
             time.sleep(1800)
             continue
 
         try:
-            target_user = x_client.get_user(username=TARGET_ACCOUNT)
-            tweets = x_client.get_users_tweets(target_user.data.id, max_results=5)
-            
-            if tweets.data:
-                users = x_client.get_retweeters(tweets.data[0].id, user_fields=["description"])
-                
-                if users.data:
-                    for u in users.data:
-                        if today_likes >= DAILY_LIMIT: break
-                        
-                        if ask_gemini_if_target(u.description or ""):
-                            try:
-                                x_client.like(tweets.data[0].id)
-                                today_likes += 1
-                                print(f"[{today_likes}] {u.username} さんを判定→いいね完了")
-                                # 人間らしい待ち時間（3〜8分）
-                                time.sleep(random.randint(180, 480))
-                            except: continue
+            today_likes = crawl_once(today_likes)
 
             # コスト節約：30分休憩
             print("巡回完了。30分休憩します。")
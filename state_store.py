@@ -0,0 +1,81 @@
+import os
+import json
+import copy
+import threading
+from contextlib import contextmanager
+
+# =========================
+# アトミック書き込み（一時ファイル → fsync → rename）
+# =========================
+def atomic_write_json(path, obj, indent=2):
+    """
+    書き込み途中で落ちても、元のファイルか新しいファイルのどちらかが必ず残る。
+    """
+    d = os.path.dirname(os.path.abspath(path))
+    os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # rename 自体もディスクに確定させる（対応していないOSは無視）
+    try:
+        fd = os.open(d, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+# =========================
+# 状態ストア（起動時に1回だけ読み、以降はメモリから返す）
+# =========================
+class StateStore:
+    """
+    JSONファイル1つ分の状態をメモリに持つ。
+    読み取りはディスクに触らず、変更は transaction() の最後に1回だけ書き出す。
+    """
+
+    def __init__(self, path, defaults=None):
+        self.path = path
+        self.defaults = defaults or {}
+        self.lock = threading.RLock()
+        self.data = self._load()
+
+    def _load(self):
+        data = copy.deepcopy(self.defaults)
+        if not os.path.exists(self.path):
+            return data
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict):
+                data.update(loaded)
+        except Exception as e:
+            print(f"state load error ({self.path}):", repr(e))
+        return data
+
+    def get(self, key, default=None):
+        with self.lock:
+            return copy.deepcopy(self.data.get(key, default))
+
+    @contextmanager
+    def transaction(self):
+        """
+        with store.transaction() as st: で dict を直接書き換える。
+        ブロックを例外なく抜けたときだけ1回書き出す（例外時はメモリも巻き戻す）。
+        """
+        with self.lock:
+            before = copy.deepcopy(self.data)
+            try:
+                yield self.data
+                self.commit()
+            except BaseException:
+                self.data = before
+                raise
+
+    def commit(self):
+        with self.lock:
+            atomic_write_json(self.path, self.data)
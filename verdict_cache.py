@@ -0,0 +1,53 @@
+import os
+import time
+import hashlib
+
+import metrics
+from state_store import StateStore
+
+# =========================
+# 基本設定
+# =========================
+VERDICT_CACHE_PATH = os.getenv("VERDICT_CACHE_PATH", "verdict_cache.json")
+# 判定を使い回す日数（過ぎたら Gemini に聞き直す）
+VERDICT_TTL_DAYS = float(os.getenv("VERDICT_TTL_DAYS", "30"))
+
+store = StateStore(VERDICT_CACHE_PATH, {"verdicts": {}})
+
+# =========================
+# ターゲット判定のキャッシュ（ユーザーID × プロフィールのハッシュ）
+#   同じ人が何度リツイートしても、プロフィールが変わらない限り Gemini には聞かない
+# =========================
+def profile_hash(description):
+    return hashlib.sha256((description or "").strip().encode("utf-8")).hexdigest()[:16]
+
+def lookup(user_id, description):
+    """
+    キャッシュ済みの判定（True/False）。無い・期限切れ・プロフィールが変わった なら None。
+    結果は bot_events_total{event="verdict_cache"} に数える
+    """
+    with store.lock:
+        entry = store.data["verdicts"].get(str(user_id))
+    if entry is None:
+        result = "miss"
+    elif time.time() - entry["at"] > VERDICT_TTL_DAYS * 86400:
+        result = "expired"
+    elif entry["hash"] != profile_hash(description):
+        result = "changed"
+    else:
+        metrics.inc("verdict_cache", result="hit")
+        return entry["verdict"]
+    metrics.inc("verdict_cache", result=result)
+    return None
+
+def save(verdicts):
+    """{user_id: (description, verdict)} を1回の書き込みでまとめて保存し、期限切れを捨てる"""
+    if not verdicts:
+        return
+    now = time.time()
+    with store.transaction() as st:
+        cache = st["verdicts"]
+        for k in [k for k, v in cache.items() if now - v["at"] > VERDICT_TTL_DAYS * 86400]:
+            del cache[k]
+        for user_id, (description, verdict) in verdicts.items():
+            cache[str(user_id)] = {"hash": profile_hash(description), "verdict": bool(verdict), "at": now}
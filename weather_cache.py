@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from state_store import atomic_write_json
+
+# =========================
+# 基本設定
+# =========================
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+WEATHER_CACHE_DIR = os.getenv("WEATHER_CACHE_DIR", "weather_cache")
+# この秒数以内のスナップショットは通信せずにそのまま使う
+WEATHER_CACHE_TTL_SEC = int(os.getenv("WEATHER_CACHE_TTL_SEC", "900"))
+# 通信失敗・遅延時に「前回の正常データ」で代用してよい古さの上限
+WEATHER_CACHE_MAX_STALE_SEC = int(os.getenv("WEATHER_CACHE_MAX_STALE_SEC", str(12 * 3600)))
+WEATHER_TIMEOUT_SEC = float(os.getenv("WEATHER_TIMEOUT_SEC", "10"))
+
+# =========================
+# HTTPセッション（接続を使い回してTLSハンドシェイクを省く）
+# =========================
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests は最初の通信の時に読み込む（起動を軽くする）
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+# =========================
+# スナップショット（座標＋取得項目ごとにディスク保存）
+# =========================
+def cache_key(params):
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def snapshot_path(key):
+    return os.path.join(WEATHER_CACHE_DIR, f"{key}.json")
+
+def load_snapshot(key):
+    path = snapshot_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snap = json.load(f)
+        if "data" not in snap or "fetched_at" not in snap:
+            return None
+        return snap
+    except Exception:
+        return None
+
+def save_snapshot(key, snap):
+    try:
+        atomic_write_json(snapshot_path(key), snap, indent=None)
+    except Exception as e:
+        print("weather snapshot save error:", repr(e))
+
+# =========================
+# 取得（TTL → 条件付きGET → 失敗時は前回データ）
+# =========================
+def fetch_json(params, ttl=None, timeout=None):
+    ttl = WEATHER_CACHE_TTL_SEC if ttl is None else ttl
+    timeout = WEATHER_TIMEOUT_SEC if timeout is None else timeout
+
+    key = cache_key(params)
+    snap = load_snapshot(key)
+    now = time.time()
+
+    if snap and now - snap["fetched_at"] < ttl:
+        return snap["data"]
+
+    headers = {}
+    if snap and snap.get("etag"):
+        headers["If-None-Match"] = snap["etag"]
+    if snap and snap.get("last_modified"):
+        headers["If-Modified-Since"] = snap["last_modified"]
+
+    try:
+        r = get_session().get(OPEN_METEO_URL, params=params, headers=headers, timeout=timeout)
+
+        # 304：手元のデータがまだ最新
+        if r.status_code == 304 and snap:
+            snap["fetched_at"] = now
+            save_snapshot(key, snap)
+            return snap["data"]
+
+        r.raise_for_status()
+        data = r.json()
+        save_snapshot(key, {
+            "fetched_at": now,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "params": params,
+            "data": data,
+        })
+        return data
+
+    except Exception as e:
+        if snap and now - snap["fetched_at"] < WEATHER_CACHE_MAX_STALE_SEC:
+            age_min = int((now - snap["fetched_at"]) / 60)
+            print(f"weather fetch error（{age_min}分前のスナップショットで代用）:", repr(e))
+            return snap["data"]
+        raise
+
+def forecast_params(lat, lon, hourly, forecast_days=2, timezone="Asia/Tokyo"):
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": ",".join(hourly),
+        "timezone": timezone,
+        "forecast_days": forecast_days,
+    }
+
+def fetch_forecast(lat, lon, hourly, forecast_days=2, timezone="Asia/Tokyo", ttl=None):
+    return fetch_json(forecast_params(lat, lon, hourly, forecast_days, timezone), ttl=ttl)
+
+def fetch_forecast_many(points, hourly, forecast_days=2, timezone="Asia/Tokyo", ttl=None, timeout=None):
+    """
+    複数地点を1リクエストでまとめて取得する（Open-Meteoの複数座標指定）。
+    points: [(lat, lon), ...]  戻り値は points と同じ順の応答リスト
+
+    スナップショットは地点ごと（fetch_forecast と同じキー）。TTL 内の地点は通信せず、
+    残りの地点だけをまとめて取りに行く。失敗したら地点ごとに前回データで代用する
+    （どの組み合わせで呼ばれても、同じ地点なら同じスナップショットを使う）。
+    取りに行くのが1地点だけのときは fetch_json で条件付きGET（ETag / Last-Modified）にする。
+    複数地点の応答の ETag は組み合わせ全体のものなので、地点ごとには保存しない。
+    """
+    if not points:
+        return []
+    ttl = WEATHER_CACHE_TTL_SEC if ttl is None else ttl
+    timeout = WEATHER_TIMEOUT_SEC if timeout is None else timeout
+
+    keys = [cache_key(forecast_params(lat, lon, hourly, forecast_days, timezone)) for lat, lon in points]
+    snaps = [load_snapshot(k) for k in keys]
+    now = time.time()
+    results = [s["data"] if s and now - s["fetched_at"] < ttl else None for s in snaps]
+    stale = [i for i, r in enumerate(results) if r is None]
+    if not stale:
+        return results
+    if len(stale) == 1:
+        i = stale[0]
+        lat, lon = points[i]
+        results[i] = fetch_json(forecast_params(lat, lon, hourly, forecast_days, timezone), ttl=ttl, timeout=timeout)
+        return results
+
+    params = {
+        "latitude": ",".join(str(points[i][0]) for i in stale),
+        "longitude": ",".join(str(points[i][1]) for i in stale),
+        "hourly": ",".join(hourly),
+        "timezone": timezone,
+        "forecast_days": forecast_days,
+    }
+    try:
+        r = get_session().get(OPEN_METEO_URL, params=params, timeout=timeout)
+        r.raise_for_status()
+        data = r.json()
+        # 1地点だけのときは配列ではなく単体で返ってくる
+        if isinstance(data, dict):
+            data = [data]
+        if len(data) != len(stale):
+            raise ValueError(f"open-meteo returned {len(data)} locations for {len(stale)} points")
+    except Exception as e:
+        # 地点ごとに前回の正常データで代用。代用できない地点があればエラー
+        for i in stale:
+            s = snaps[i]
+            if not (s and now - s["fetched_at"] < WEATHER_CACHE_MAX_STALE_SEC):
+                raise
+            results[i] = s["data"]
+        age_min = int(max(now - snaps[i]["fetched_at"] for i in stale) / 60)
+        print(f"weather fetch error（最大{age_min}分前のスナップショットで代用）:", repr(e))
+        return results
+
+    for i, d in zip(stale, data):
+        results[i] = d
+        lat, lon = points[i]
+        save_snapshot(keys[i], {
+            "fetched_at": now,
+            "params": forecast_params(lat, lon, hourly, forecast_days, timezone),
+            "data": d,
+        })
+    return results